@@ -0,0 +1,220 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from queue_consumer import receive_batch, MAX_MESSAGES_PER_RECEIVE
+import random
+import threading
+import time
+import weakref
+
+# -------------------------------------------------------------
+# <summary>
+# Adaptive polling for queue consumers. Queue storage has no long polling, so a consumer either
+# calls receive_messages in a tight loop, paying for a transaction per empty call, or sleeps for
+# a fixed time between calls and adds that time to the latency of every message.
+#
+# AdaptivePoller polls again immediately while receives return messages. After an empty receive
+# it waits base_interval, and every further empty receive multiplies the wait by backoff_factor up
+# to max_interval. Each wait is shortened by a random fraction of up to jitter, so consumers that
+# went idle together do not keep polling in lockstep. The first message received snaps the poller
+# back to fast polling. The batch size doubles after a full batch and halves after a partial one,
+# so consumers of a shallow queue do not hide more messages from each other than there is work.
+#
+# Producers in the same process can notify a WakeupSignal after sending, which ends the wait of
+# every poller subscribed to it, so those messages are picked up without waiting for the backoff.
+# </summary>
+# -------------------------------------------------------------
+
+# In-process wake-up signal shared by producers and pollers.
+class WakeupSignal():
+
+    def __init__(self):
+        self._pollers = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def subscribe(self, poller):
+        with self._lock:
+            self._pollers.add(poller)
+
+    # Wakes every subscribed poller. Call after sending messages the pollers consume.
+    def notify(self):
+        with self._lock:
+            pollers = list(self._pollers)
+        for poller in pollers:
+            poller.wake()
+
+# Counters of an AdaptivePoller.
+class PollerStats():
+
+    def __init__(self):
+        self.receive_calls = 0
+        self.empty_receives = 0
+        self.receive_errors = 0
+        self.received = 0
+        self.wakeups = 0
+        self.slept = 0.0
+
+class AdaptivePoller():
+
+    # Input Arguments:
+    # queue_client - QueueClient to receive from
+    # base_interval - seconds to wait after the first empty receive
+    # max_interval - longest wait between receives of an idle queue
+    # backoff_factor - factor the wait grows by after every further empty receive
+    # jitter - largest fraction a wait is randomly shortened by, between 0 and 1
+    # min_batch_size, max_batch_size - bounds of the number of messages requested per receive
+    # visibility_timeout - seconds received messages stay invisible to other consumers
+    # wakeup - optional WakeupSignal that ends the current wait when notified
+    # seed - seed for the jitter, for reproducible runs
+    def __init__(self, queue_client, base_interval=0.1, max_interval=20.0, backoff_factor=2.0, jitter=0.5,
+                 min_batch_size=1, max_batch_size=MAX_MESSAGES_PER_RECEIVE, visibility_timeout=None, wakeup=None, seed=None):
+        if not 0 <= jitter <= 1:
+            raise ValueError('jitter must be between 0 and 1')
+        if not 1 <= min_batch_size <= max_batch_size <= MAX_MESSAGES_PER_RECEIVE:
+            raise ValueError('batch sizes must satisfy 1 <= min_batch_size <= max_batch_size <= {0}'.format(MAX_MESSAGES_PER_RECEIVE))
+        self.queue_client = queue_client
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.visibility_timeout = visibility_timeout
+        self.batch_size = max_batch_size
+        self.interval = 0.0
+        self.stats = PollerStats()
+        self._random = random.Random(seed)
+        self._condition = threading.Condition()
+        self._woken = False
+        self._closed = False
+        if wakeup is not None:
+            wakeup.subscribe(self)
+
+    # Receives one batch with the current batch size and adapts the interval and batch size to the result.
+    # Errors back off like empty receives and are raised to the caller.
+    def poll(self):
+        self.stats.receive_calls += 1
+        try:
+            messages = receive_batch(self.queue_client, self.batch_size, self.visibility_timeout)
+        except Exception:
+            self.stats.receive_errors += 1
+            self._back_off()
+            raise
+        if messages:
+            self.stats.received += len(messages)
+            self.interval = 0.0
+            if len(messages) >= self.batch_size:
+                self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+            else:
+                self.batch_size = max(self.batch_size // 2, self.min_batch_size)
+        else:
+            self.stats.empty_receives += 1
+            self._back_off()
+        return messages
+
+    def _back_off(self):
+        self.interval = min(max(self.interval * self.backoff_factor, self.base_interval), self.max_interval)
+
+    # Waits for the current interval, or until wake() or close() is called.
+    # Returns True when the wait was ended early.
+    def sleep(self):
+        delay = self.interval * (1 - self.jitter * self._random.random())
+        start = time.monotonic()
+        with self._condition:
+            woken = self._condition.wait_for(lambda: self._woken or self._closed, timeout=delay) if delay > 0 else self._woken
+            self._woken = False
+        self.stats.slept += time.monotonic() - start
+        if woken and not self._closed:
+            self.stats.wakeups += 1
+            self.interval = 0.0
+        return woken
+
+    # Ends the current or next wait and resets the poller to fast polling.
+    def wake(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    # Stops batches() and ends the current wait.
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    # Yields non-empty batches of messages until close() is called, waiting between empty receives.
+    def batches(self):
+        while not self._closed:
+            messages = self.poll()
+            if messages:
+                yield messages
+            else:
+                self.sleep()
+
+def _idle_run(name, options, use_wakeup, cycles, idle_time, latency):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_service = LocalQueueServiceClient(latency=latency, seed=1)
+    queue_client = queue_service.create_queue('benchmarkqueue')
+    wakeup = WakeupSignal() if use_wakeup else None
+    poller = AdaptivePoller(queue_client, wakeup=wakeup, seed=1, **options)
+    pickup_latencies = []
+
+    def consume():
+        for messages in poller.batches():
+            for message in messages:
+                pickup_latencies.append(time.time() - float(message.content))
+                queue_client.delete_message(message)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    sender = random.Random(1)
+    start = time.monotonic()
+    for i in range(cycles):
+        time.sleep(idle_time * sender.uniform(0.5, 1.5))
+        queue_client.send_message(str(time.time()))
+        if wakeup is not None:
+            wakeup.notify()
+    time.sleep(options['max_interval'])
+    poller.close()
+    consumer.join()
+    elapsed = time.monotonic() - start
+
+    return '{0:<26} {1:8.0f} idle calls/hour, pickup latency mean {2:6.1f} ms, max {3:6.1f} ms'.format(
+        name, poller.stats.empty_receives * 3600 / elapsed, 1000 * sum(pickup_latencies) / len(pickup_latencies),
+        1000 * max(pickup_latencies))
+
+# Idles a consumer on the local stand-in and sends a single message at random times, reporting
+# the receive calls the consumer makes per hour of idle queue and how long each message waited to
+# be picked up. The queue service has no long polling, so these two are the cost/latency trade-off.
+# The configurations run side by side, each against its own stand-in.
+def run_benchmark(cycles=6, idle_time=4.0, latency=0.002):
+    from concurrent.futures import ThreadPoolExecutor
+
+    configurations = [
+        ('fixed 0.1s', dict(base_interval=0.1, max_interval=0.1, jitter=0.0), False),
+        ('fixed 1s', dict(base_interval=1.0, max_interval=1.0, jitter=0.0), False),
+        ('adaptive max 1s', dict(base_interval=0.05, max_interval=1.0), False),
+        ('adaptive max 4s', dict(base_interval=0.05, max_interval=4.0), False),
+        ('adaptive max 4s + wakeup', dict(base_interval=0.05, max_interval=4.0), True),
+    ]
+    with ThreadPoolExecutor(max_workers=len(configurations)) as executor:
+        runs = [executor.submit(_idle_run, name, options, use_wakeup, cycles, idle_time, latency)
+                for name, options, use_wakeup in configurations]
+        for run in runs:
+            print(run.result())
+
+if __name__ == '__main__':
+    run_benchmark()
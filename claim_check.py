@@ -0,0 +1,233 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from message_codec import CodecQueueClient, MessageCodec, BytesSerializer, encoded_size, serializer_for
+import io
+import mmap
+import os
+import re
+import threading
+import uuid
+
+# -------------------------------------------------------------
+# <summary>
+# Claim check pattern for payloads that do not fit in a queue message. Payloads whose encoded
+# message would exceed a threshold are written to an object store and the queue message only
+# carries a reference to them. Consumers receive a ClaimCheck in place of the content and fetch
+# the payload only when they need it, either whole or as a stream of chunks read through a
+# memory map, so the queue itself only ever moves small messages.
+#
+# A store implements put(data) -> reference, open(reference) -> readable binary file object,
+# delete(reference), and valid_reference(reference) -> bool. References arrive in queue messages
+# that anyone with send access can write, so a store must reject references it did not create.
+# InMemoryBlobStore and FileSystemBlobStore are provided for local use.
+# </summary>
+# -------------------------------------------------------------
+
+# Key of the reference message naming the stored payload.
+CLAIM_CHECK_KEY = '__claim_check__'
+
+# Encoded message size above which payloads are offloaded to the store, leaving room under the 64 KB limit.
+DEFAULT_THRESHOLD = 48 * 1024
+
+# References created by the stores below: uuid4().hex
+_REFERENCE_PATTERN = re.compile('^[0-9a-f]{32}$')
+
+def _valid_reference(reference):
+    return isinstance(reference, str) and _REFERENCE_PATTERN.match(reference) is not None
+
+# Keeps payloads in process memory. Intended for tests and benchmarks.
+class InMemoryBlobStore():
+
+    def __init__(self):
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        reference = uuid.uuid4().hex
+        with self._lock:
+            self._blobs[reference] = bytes(data)
+        return reference
+
+    def valid_reference(self, reference):
+        return _valid_reference(reference)
+
+    def open(self, reference):
+        with self._lock:
+            return io.BytesIO(self._blobs[reference])
+
+    def delete(self, reference):
+        with self._lock:
+            self._blobs.pop(reference, None)
+
+# Keeps payloads as files in a local directory and reads them through a memory map,
+# so only the pages a consumer touches are loaded.
+class FileSystemBlobStore():
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def valid_reference(self, reference):
+        return _valid_reference(reference)
+
+    # Returns the file of a reference, refusing anything but a reference this store created,
+    # so a crafted message cannot name a file outside root.
+    def _path(self, reference):
+        if not self.valid_reference(reference):
+            raise ValueError('Invalid claim check reference: {0!r}'.format(reference))
+        return os.path.join(self.root, reference)
+
+    def put(self, data):
+        reference = uuid.uuid4().hex
+        path = self._path(reference)
+        # write to a temporary name first so readers never see a partial payload
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        return reference
+
+    def open(self, reference):
+        with open(self._path(reference), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return io.BytesIO()
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def delete(self, reference):
+        try:
+            os.remove(self._path(reference))
+        except FileNotFoundError:
+            pass
+
+# Reference to an offloaded payload, received in place of the message content.
+class ClaimCheck():
+
+    def __init__(self, store, reference, size, format_id):
+        self.store = store
+        self.reference = reference
+        self.size = size
+        self.format_id = format_id
+
+    # Returns a readable binary file object over the payload; use it as a context manager.
+    def open(self):
+        return self.store.open(self.reference)
+
+    # Yields the payload in chunks of at most chunk_size bytes.
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        with self.open() as payload:
+            while True:
+                chunk = payload.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    # Returns the whole payload as bytes.
+    def read(self):
+        with self.open() as payload:
+            return payload.read()
+
+    # Returns the payload decoded back to the value that was sent.
+    def value(self):
+        return serializer_for(self.format_id).loads(self.read())
+
+    # Deletes the payload from the store.
+    def delete(self):
+        self.store.delete(self.reference)
+
+# Wraps a QueueClient so that messages too large for the queue are sent through a claim check.
+# Received messages carrying a reference get a ClaimCheck as content; other messages are decoded
+# by the codec as usual.
+class ClaimCheckQueueClient(CodecQueueClient):
+
+    # Input Arguments:
+    # queue_client - QueueClient to send and receive messages with
+    # store - object store receiving payloads over the threshold
+    # codec - MessageCodec used for messages and references
+    # threshold - encoded message size, in bytes of message text before compression, above which payloads are offloaded
+    def __init__(self, queue_client, store, codec=None, threshold=DEFAULT_THRESHOLD):
+        super(ClaimCheckQueueClient, self).__init__(queue_client, codec)
+        self.store = store
+        self.threshold = threshold
+        self._bytes_codec = MessageCodec(BytesSerializer(), self.codec.compressor, self.codec.compress_threshold)
+
+    def send_message(self, content, **kwargs):
+        text, reference = self._message_text(content)
+        try:
+            return self.queue_client.send_message(text, **kwargs)
+        except Exception:
+            if reference is not None:
+                self.store.delete(reference)
+            raise
+
+    # Updates the message with content offloaded the same way as on send. When given the received
+    # message itself, the payload its previous content referenced is deleted once the update succeeds.
+    def update_message(self, message, pop_receipt=None, content=None, **kwargs):
+        if content is None:
+            return self.queue_client.update_message(message, pop_receipt=pop_receipt, **kwargs)
+        text, reference = self._message_text(content)
+        try:
+            updated = self.queue_client.update_message(message, pop_receipt=pop_receipt, content=text, **kwargs)
+        except Exception:
+            if reference is not None:
+                self.store.delete(reference)
+            raise
+        previous = getattr(message, 'content', None)
+        if isinstance(previous, ClaimCheck):
+            previous.delete()
+        return updated
+
+    # Returns the message text for content and the reference of its stored payload, None when the
+    # payload goes inline. The payload is serialized once and its uncompressed encoded size decides,
+    # so compression can only shrink an inline message.
+    def _message_text(self, content):
+        # raw bytes are stored as they are, other values go through the codec serializer
+        codec = self._bytes_codec if isinstance(content, (bytes, bytearray, memoryview)) else self.codec
+        payload = codec.serializer.dumps(content)
+        if encoded_size(len(payload)) <= self.threshold:
+            return codec.encode_payload(payload), None
+
+        reference = self.store.put(payload)
+        check = {CLAIM_CHECK_KEY: reference, 'size': len(payload), 'format': codec.serializer.format_id}
+        return self.codec.encode(check), reference
+
+    # Deletes the message and, when given the received message itself, the payload it references.
+    def delete_message(self, message, pop_receipt=None, **kwargs):
+        self.queue_client.delete_message(message, pop_receipt=pop_receipt, **kwargs)
+        content = getattr(message, 'content', None)
+        if isinstance(content, ClaimCheck):
+            content.delete()
+
+    def _decode_message(self, message):
+        content = self.codec.decode(message.content)
+        if isinstance(content, dict) and CLAIM_CHECK_KEY in content and self._valid_check(content):
+            content = ClaimCheck(self.store, content[CLAIM_CHECK_KEY], content['size'], content['format'])
+        message.content = content
+        return message
+
+    # A malformed reference message is not treated as a claim check: its content stays the decoded
+    # dict, so nothing is read from or deleted in the store on its behalf.
+    def _valid_check(self, content):
+        size, format_id = content.get('size'), content.get('format')
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            return False
+        if not isinstance(format_id, int) or isinstance(format_id, bool):
+            return False
+        try:
+            serializer_for(format_id)
+        except ValueError:
+            return False
+        return self.store.valid_reference(content[CLAIM_CHECK_KEY])
@@ -0,0 +1,559 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.storage.queue import QueueMessage, QueueProperties, QueueAnalyticsLogging, Metrics, StorageErrorCode
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.core.paging import ItemPaged
+from azure.core.async_paging import AsyncItemPaged
+import asyncio
+import collections
+import copy
+import datetime
+import random
+import threading
+import time
+import uuid
+
+# -------------------------------------------------------------
+# <summary>
+# Local in-process stand-in for the Azure Queue service. LocalQueueServiceClient and LocalQueueClient
+# implement the parts of the QueueServiceClient and QueueClient surface used by the samples: creating,
+# listing and deleting queues, sending, peeking, receiving, updating, deleting and clearing messages,
+# queue properties, metadata, access policies and service properties. Visibility timeouts, message
+# expiry and pop receipts behave like the service, and failures raise the same azure.core exceptions.
+#
+# AsyncLocalQueueServiceClient and AsyncLocalQueueClient expose the same queues with the
+# azure.storage.queue.aio surface, simulating latency with asyncio.sleep.
+#
+# Every call sleeps for a configurable latency, per operation if needed, and can fail with an
+# injected error, either scripted (inject_failure) or at a seeded random rate, so concurrency and
+# retry code can be benchmarked offline and deterministically.
+# </summary>
+# -------------------------------------------------------------
+
+# Service limits
+MAX_MESSAGE_SIZE = 64 * 1024
+MAX_MESSAGES_PER_CALL = 32
+MAX_VISIBILITY_TIMEOUT = 7 * 24 * 3600
+DEFAULT_TIME_TO_LIVE = 7 * 24 * 3600
+MAX_SIGNED_IDENTIFIERS = 5
+
+def _storage_error(error_type, status_code, error_code, message):
+    error = error_type(message=message)
+    error.status_code = status_code
+    error.error_code = error_code
+    return error
+
+def _queue_not_found():
+    return _storage_error(ResourceNotFoundError, 404, StorageErrorCode.queue_not_found, 'The specified queue does not exist.')
+
+def _message_not_found():
+    return _storage_error(ResourceNotFoundError, 404, StorageErrorCode.message_not_found, 'The specified message does not exist.')
+
+def _pop_receipt_mismatch():
+    return _storage_error(HttpResponseError, 400, StorageErrorCode.pop_receipt_mismatch,
+        'The specified pop receipt did not match the pop receipt for a dequeued message.')
+
+def _out_of_range(name):
+    return _storage_error(HttpResponseError, 400, StorageErrorCode.out_of_range_query_parameter_value,
+        'The value for {0} is not within the permitted range.'.format(name))
+
+def _request_body_too_large():
+    return _storage_error(HttpResponseError, 413, StorageErrorCode.request_body_too_large,
+        'The request body is too large and exceeds the maximum permissible limit.')
+
+# Size of message content as the service measures it: text is sent as UTF-8, so a non-ASCII
+# character counts for up to four bytes.
+def _message_size(content):
+    if isinstance(content, str):
+        return len(content.encode('utf-8'))
+    return len(content)
+
+# Returns a server busy error, the error the service returns when an account or queue is throttled.
+def server_busy_error():
+    return _storage_error(HttpResponseError, 503, StorageErrorCode.server_busy,
+        'The server is currently unable to receive requests. Please retry your request.')
+
+# State of one queue, shared by every LocalQueueClient for it.
+class _LocalQueue():
+
+    def __init__(self, name, metadata):
+        self.name = name
+        self.metadata = dict(metadata or {})
+        self.signed_identifiers = {}
+        self.messages = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    # Must be called with the lock held
+    def remove_expired(self, now):
+        expired = [message.id for message in self.messages.values() if message.expires_on <= now]
+        for message_id in expired:
+            del self.messages[message_id]
+
+class LocalQueueServiceClient():
+
+    # Input Arguments:
+    # latency - seconds every simulated service call takes
+    # operation_latency - optional dict of operation name to seconds, overriding latency for that operation
+    # jitter - fraction of the latency added or removed at random, e.g. 0.2 for +/-20%
+    # failure_rate - probability that a call fails with failure_error
+    # failure_operations - optional set of operation names failure_rate applies to, all operations when None
+    # failure_error - callable returning the exception to raise for injected failures, server busy by default
+    # seed - seed of the random generator used for jitter and failures, for reproducible runs
+    def __init__(self, latency=0.0, operation_latency=None, jitter=0.0, failure_rate=0.0, failure_operations=None,
+                 failure_error=server_busy_error, seed=None):
+        self.latency = latency
+        self.operation_latency = dict(operation_latency or {})
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_operations = failure_operations
+        self.failure_error = failure_error
+        self.call_counts = collections.Counter()
+        self.account_name = 'localqueueservice'
+        self.url = 'http://127.0.0.1/' + self.account_name
+        self._random = random.Random(seed)
+        self._scripted_failures = collections.defaultdict(collections.deque)
+        self._queues = {}
+        self._service_properties = {
+            'analytics_logging': QueueAnalyticsLogging(),
+            'hour_metrics': Metrics(),
+            'minute_metrics': Metrics(),
+            'cors': [],
+        }
+        self._lock = threading.Lock()
+
+    # Makes the next count calls of operation raise error, or the configured failure_error when not given.
+    def inject_failure(self, operation, count=1, error=None):
+        with self._lock:
+            for i in range(count):
+                self._scripted_failures[operation].append(error)
+
+    # Counts a call of operation and returns its latency and the injected error to raise, if any.
+    def _prepare_call(self, operation):
+        with self._lock:
+            self.call_counts[operation] += 1
+            latency = self.operation_latency.get(operation, self.latency)
+            if latency and self.jitter:
+                latency *= 1 + self._random.uniform(-self.jitter, self.jitter)
+            error = None
+            if self._scripted_failures[operation]:
+                error = self._scripted_failures[operation].popleft() or self.failure_error()
+            elif self.failure_rate and (self.failure_operations is None or operation in self.failure_operations) \
+                    and self._random.random() < self.failure_rate:
+                error = self.failure_error()
+        return latency, error
+
+    # Waits for the latency of operation and raises any injected failure.
+    def _simulate_call(self, operation):
+        latency, error = self._prepare_call(operation)
+        if latency:
+            time.sleep(latency)
+        if error is not None:
+            raise error
+
+    # Returns a client over the same queues whose calls neither wait nor fail.
+    # The asyncio stand-in uses it after simulating the call without blocking the event loop.
+    def _without_simulation(self):
+        service = copy.copy(self)
+        service.latency = 0.0
+        service.operation_latency = {}
+        service.failure_rate = 0.0
+        service.call_counts = collections.Counter()
+        service._scripted_failures = collections.defaultdict(collections.deque)
+        return service
+
+    def _get_queue(self, name):
+        with self._lock:
+            state = self._queues.get(name)
+        if state is None:
+            raise _queue_not_found()
+        return state
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_service_properties(self, **kwargs):
+        self._simulate_call('get_service_properties')
+        with self._lock:
+            return dict(self._service_properties)
+
+    def set_service_properties(self, analytics_logging=None, hour_metrics=None, minute_metrics=None, cors=None, **kwargs):
+        self._simulate_call('set_service_properties')
+        updates = {'analytics_logging': analytics_logging, 'hour_metrics': hour_metrics,
+                   'minute_metrics': minute_metrics, 'cors': cors}
+        with self._lock:
+            for key, value in updates.items():
+                if value is not None:
+                    self._service_properties[key] = value
+
+    def list_queues(self, name_starts_with=None, include_metadata=False, results_per_page=None, **kwargs):
+        page_size = results_per_page or 5000
+
+        def get_next(continuation_token):
+            self._simulate_call('list_queues')
+            with self._lock:
+                names = sorted(name for name in self._queues if name.startswith(name_starts_with or ''))
+                if continuation_token:
+                    names = [name for name in names if name >= continuation_token]
+                page = [self._queues[name] for name in names[:page_size]]
+                next_marker = names[page_size] if len(names) > page_size else None
+            queues = []
+            for state in page:
+                properties = QueueProperties(metadata=dict(state.metadata) if include_metadata else None)
+                properties.name = state.name
+                queues.append(properties)
+            return next_marker, queues
+
+        def extract_data(response):
+            next_marker, queues = response
+            return next_marker, iter(queues)
+
+        return ItemPaged(get_next, extract_data)
+
+    def create_queue(self, name, metadata=None, **kwargs):
+        queue_client = self.get_queue_client(name)
+        queue_client.create_queue(metadata=metadata)
+        return queue_client
+
+    def delete_queue(self, queue, **kwargs):
+        self.get_queue_client(getattr(queue, 'name', queue)).delete_queue()
+
+    def get_queue_client(self, queue, **kwargs):
+        return LocalQueueClient(self, getattr(queue, 'name', queue))
+
+# Client for one queue of a LocalQueueServiceClient. Like QueueClient it can be created
+# before the queue exists; operations on a missing queue raise ResourceNotFoundError.
+class LocalQueueClient():
+
+    def __init__(self, service, queue_name):
+        self.service = service
+        self.queue_name = queue_name
+        self.account_name = service.account_name
+        self.url = service.url + '/' + queue_name
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def create_queue(self, metadata=None, **kwargs):
+        self.service._simulate_call('create_queue')
+        with self.service._lock:
+            state = self.service._queues.get(self.queue_name)
+            if state is None:
+                self.service._queues[self.queue_name] = _LocalQueue(self.queue_name, metadata)
+            elif state.metadata != dict(metadata or {}):
+                # like the service, creating an existing queue only fails when the metadata differs
+                raise _storage_error(ResourceExistsError, 409, StorageErrorCode.queue_already_exists,
+                    'The specified queue already exists.')
+
+    def delete_queue(self, **kwargs):
+        self.service._simulate_call('delete_queue')
+        with self.service._lock:
+            if self.service._queues.pop(self.queue_name, None) is None:
+                raise _queue_not_found()
+
+    def get_queue_properties(self, **kwargs):
+        self.service._simulate_call('get_queue_properties')
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            state.remove_expired(datetime.datetime.utcnow())
+            properties = QueueProperties(metadata=dict(state.metadata))
+            properties.approximate_message_count = len(state.messages)
+        properties.name = self.queue_name
+        return properties
+
+    def set_queue_metadata(self, metadata=None, **kwargs):
+        self.service._simulate_call('set_queue_metadata')
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            state.metadata = dict(metadata or {})
+
+    def get_queue_access_policy(self, **kwargs):
+        self.service._simulate_call('get_queue_access_policy')
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            return dict(state.signed_identifiers)
+
+    def set_queue_access_policy(self, signed_identifiers, **kwargs):
+        self.service._simulate_call('set_queue_access_policy')
+        if len(signed_identifiers) > MAX_SIGNED_IDENTIFIERS:
+            raise ValueError('Too many access policies provided. The server does not support setting '
+                             'more than 5 access policies on a single resource.')
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            state.signed_identifiers = dict(signed_identifiers)
+
+    def send_message(self, content, visibility_timeout=None, time_to_live=None, **kwargs):
+        self.service._simulate_call('send_message')
+        if isinstance(content, (str, bytes)) and _message_size(content) > MAX_MESSAGE_SIZE:
+            raise _request_body_too_large()
+        if visibility_timeout is not None and not 0 <= visibility_timeout <= MAX_VISIBILITY_TIMEOUT:
+            raise _out_of_range('visibilitytimeout')
+        state = self.service._get_queue(self.queue_name)
+
+        now = datetime.datetime.utcnow()
+        message = QueueMessage(content=content)
+        message.id = str(uuid.uuid4())
+        message.inserted_on = now
+        if time_to_live == -1:
+            message.expires_on = datetime.datetime.max
+        else:
+            message.expires_on = now + datetime.timedelta(seconds=time_to_live or DEFAULT_TIME_TO_LIVE)
+        message.next_visible_on = now + datetime.timedelta(seconds=visibility_timeout or 0)
+        message.pop_receipt = str(uuid.uuid4())
+        message.dequeue_count = 0
+        with state.lock:
+            state.messages[message.id] = message
+        # like the SDK, the returned message carries the content that was sent but no dequeue count
+        sent = copy.copy(message)
+        sent.dequeue_count = None
+        return sent
+
+    # Returns the messages as pages of at most messages_per_page, and like the SDK stops on the first empty receive.
+    def receive_messages(self, messages_per_page=None, visibility_timeout=None, **kwargs):
+        count = messages_per_page or 1
+        if not 1 <= count <= MAX_MESSAGES_PER_CALL:
+            raise _out_of_range('numofmessages')
+        if visibility_timeout is not None and not 1 <= visibility_timeout <= MAX_VISIBILITY_TIMEOUT:
+            raise _out_of_range('visibilitytimeout')
+
+        def get_next(continuation_token):
+            return self._dequeue(count, 30 if visibility_timeout is None else visibility_timeout)
+
+        def extract_data(messages):
+            if not messages:
+                raise StopIteration('End of paging')
+            return 'TOKEN_IGNORED', iter(messages)
+
+        return ItemPaged(get_next, extract_data)
+
+    def _dequeue(self, count, visibility_timeout):
+        self.service._simulate_call('receive_messages')
+        state = self.service._get_queue(self.queue_name)
+        now = datetime.datetime.utcnow()
+        received = []
+        with state.lock:
+            for message in state.messages.values():
+                if len(received) == count:
+                    break
+                if message.next_visible_on <= now < message.expires_on:
+                    message.next_visible_on = now + datetime.timedelta(seconds=visibility_timeout)
+                    message.pop_receipt = str(uuid.uuid4())
+                    message.dequeue_count += 1
+                    received.append(copy.copy(message))
+        return received
+
+    def peek_messages(self, max_messages=None, **kwargs):
+        self.service._simulate_call('peek_messages')
+        count = max_messages or 1
+        if not 1 <= count <= MAX_MESSAGES_PER_CALL:
+            raise _out_of_range('numofmessages')
+        state = self.service._get_queue(self.queue_name)
+        now = datetime.datetime.utcnow()
+        peeked = []
+        with state.lock:
+            for message in state.messages.values():
+                if len(peeked) == count:
+                    break
+                if message.next_visible_on <= now < message.expires_on:
+                    message = copy.copy(message)
+                    # peeked messages carry no pop receipt or visibility time
+                    message.pop_receipt = None
+                    message.next_visible_on = None
+                    peeked.append(message)
+        return peeked
+
+    # Finds the stored message a pop receipt was issued for. Must be called with the queue lock held.
+    def _find_message(self, state, message_id, pop_receipt):
+        stored = state.messages.get(message_id)
+        if stored is None:
+            raise _message_not_found()
+        if stored.pop_receipt != pop_receipt:
+            raise _pop_receipt_mismatch()
+        return stored
+
+    def update_message(self, message, pop_receipt=None, content=None, visibility_timeout=None, **kwargs):
+        self.service._simulate_call('update_message')
+        if visibility_timeout is not None and not 0 <= visibility_timeout <= MAX_VISIBILITY_TIMEOUT:
+            raise _out_of_range('visibilitytimeout')
+        if isinstance(content, (str, bytes)) and _message_size(content) > MAX_MESSAGE_SIZE:
+            raise _request_body_too_large()
+        message_id = getattr(message, 'id', message)
+        pop_receipt = pop_receipt or getattr(message, 'pop_receipt', None)
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            stored = self._find_message(state, message_id, pop_receipt)
+            if content is not None:
+                stored.content = content
+            stored.next_visible_on = datetime.datetime.utcnow() + datetime.timedelta(seconds=visibility_timeout or 0)
+            stored.pop_receipt = str(uuid.uuid4())
+            return copy.copy(stored)
+
+    def delete_message(self, message, pop_receipt=None, **kwargs):
+        self.service._simulate_call('delete_message')
+        message_id = getattr(message, 'id', message)
+        pop_receipt = pop_receipt or getattr(message, 'pop_receipt', None)
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            self._find_message(state, message_id, pop_receipt)
+            del state.messages[message_id]
+
+    def clear_messages(self, **kwargs):
+        self.service._simulate_call('clear_messages')
+        state = self.service._get_queue(self.queue_name)
+        with state.lock:
+            state.messages.clear()
+
+async def _async_iter(items):
+    for item in items:
+        yield item
+
+# asyncio counterpart of LocalQueueServiceClient, sharing the queues, latency and failure settings of service.
+class AsyncLocalQueueServiceClient():
+
+    def __init__(self, service=None):
+        self.service = service or LocalQueueServiceClient()
+        self._direct = self.service._without_simulation()
+
+    async def _simulate_call(self, operation):
+        latency, error = self.service._prepare_call(operation)
+        if latency:
+            await asyncio.sleep(latency)
+        if error is not None:
+            raise error
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def get_service_properties(self, **kwargs):
+        await self._simulate_call('get_service_properties')
+        return self._direct.get_service_properties(**kwargs)
+
+    async def set_service_properties(self, **kwargs):
+        await self._simulate_call('set_service_properties')
+        return self._direct.set_service_properties(**kwargs)
+
+    def list_queues(self, name_starts_with=None, include_metadata=False, results_per_page=None, **kwargs):
+        pages = self._direct.list_queues(name_starts_with, include_metadata, results_per_page).by_page()
+
+        async def get_next(continuation_token):
+            await self._simulate_call('list_queues')
+            return list(next(pages, []))
+
+        async def extract_data(queues):
+            # the synchronous pager already holds the marker of the next page, if any
+            return pages.continuation_token, _async_iter(queues)
+
+        return AsyncItemPaged(get_next, extract_data)
+
+    async def create_queue(self, name, metadata=None, **kwargs):
+        queue_client = self.get_queue_client(name)
+        await queue_client.create_queue(metadata=metadata)
+        return queue_client
+
+    async def delete_queue(self, queue, **kwargs):
+        await self.get_queue_client(getattr(queue, 'name', queue)).delete_queue()
+
+    def get_queue_client(self, queue, **kwargs):
+        return AsyncLocalQueueClient(self, getattr(queue, 'name', queue))
+
+# asyncio counterpart of LocalQueueClient.
+class AsyncLocalQueueClient():
+
+    def __init__(self, service, queue_name):
+        self.service = service
+        self.queue_name = queue_name
+        self._direct = service._direct.get_queue_client(queue_name)
+        self.account_name = self._direct.account_name
+        self.url = self._direct.url
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _call(self, operation, *args, **kwargs):
+        await self.service._simulate_call(operation)
+        return getattr(self._direct, operation)(*args, **kwargs)
+
+    async def create_queue(self, **kwargs):
+        return await self._call('create_queue', **kwargs)
+
+    async def delete_queue(self, **kwargs):
+        return await self._call('delete_queue', **kwargs)
+
+    async def get_queue_properties(self, **kwargs):
+        return await self._call('get_queue_properties', **kwargs)
+
+    async def set_queue_metadata(self, metadata=None, **kwargs):
+        return await self._call('set_queue_metadata', metadata, **kwargs)
+
+    async def get_queue_access_policy(self, **kwargs):
+        return await self._call('get_queue_access_policy', **kwargs)
+
+    async def set_queue_access_policy(self, signed_identifiers, **kwargs):
+        return await self._call('set_queue_access_policy', signed_identifiers, **kwargs)
+
+    async def send_message(self, content, **kwargs):
+        return await self._call('send_message', content, **kwargs)
+
+    async def peek_messages(self, max_messages=None, **kwargs):
+        return await self._call('peek_messages', max_messages, **kwargs)
+
+    async def update_message(self, message, pop_receipt=None, content=None, **kwargs):
+        return await self._call('update_message', message, pop_receipt, content, **kwargs)
+
+    async def delete_message(self, message, pop_receipt=None, **kwargs):
+        return await self._call('delete_message', message, pop_receipt, **kwargs)
+
+    async def clear_messages(self, **kwargs):
+        return await self._call('clear_messages', **kwargs)
+
+    def receive_messages(self, messages_per_page=None, visibility_timeout=None, **kwargs):
+        pages = self._direct.receive_messages(messages_per_page=messages_per_page,
+                                              visibility_timeout=visibility_timeout).by_page()
+
+        async def get_next(continuation_token):
+            await self.service._simulate_call('receive_messages')
+            return list(next(pages, []))
+
+        async def extract_data(messages):
+            if not messages:
+                raise StopAsyncIteration('End of paging')
+            return 'TOKEN_IGNORED', _async_iter(messages)
+
+        return AsyncItemPaged(get_next, extract_data)
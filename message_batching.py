@@ -0,0 +1,216 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from message_codec import MessageCodec, MessageTooLargeError, MAX_MESSAGE_SIZE, HEADER_SIZE
+from queue_consumer import receive_batch, MAX_MESSAGES_PER_RECEIVE
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Packs many small logical records into one queue message. Every queue operation is billed and
+# pays a round trip, so sending a few hundred bytes per message is dominated by request overhead.
+# BatchingProducer buffers records and sends them as a single envelope message when the next
+# record would not fit in max_message_size, when max_records is reached, or when the oldest
+# buffered record has waited linger seconds, whichever comes first.
+#
+# Partial failure semantics:
+# - A physical message is sent atomically. If the send fails, every record in it fails together
+#   and is reported once to on_error with the list of records; nothing is retried automatically.
+# - A physical message is acknowledged atomically. BatchingConsumer deletes a message only after
+#   all its records have been consumed. If processing stops part way through a message, the whole
+#   message is redelivered after its visibility timeout, including records already processed,
+#   so record handlers must be idempotent (at-least-once delivery per record).
+# </summary>
+# -------------------------------------------------------------
+
+# Key of the envelope dictionary holding the packed records.
+BATCH_KEY = '__batch__'
+
+# Returns the records packed in a decoded message content. Content that is not an envelope is a single record.
+def unpack_records(content):
+    if isinstance(content, dict) and BATCH_KEY in content and len(content) == 1:
+        return content[BATCH_KEY]
+    return [content]
+
+# Counters of a BatchingProducer.
+class BatchingStats():
+
+    def __init__(self):
+        self.records = 0
+        self.messages = 0
+        self.failed_messages = 0
+        self.failed_records = 0
+
+    @property
+    def records_per_message(self):
+        return float(self.records) / self.messages if self.messages else 0.0
+
+class BatchingProducer():
+
+    # Input Arguments:
+    # queue_client - QueueClient to send the envelopes to
+    # codec - MessageCodec used to encode envelopes, JSON when not given
+    # max_message_size - largest encoded envelope, in bytes of message text
+    # max_records - optional maximum number of records per envelope
+    # linger - seconds a record may wait in the buffer before the buffer is sent
+    # on_error - optional callable invoked with (records, exception) when an envelope fails to send
+    def __init__(self, queue_client, codec=None, max_message_size=MAX_MESSAGE_SIZE, max_records=None, linger=0.05,
+                 on_error=None):
+        self.queue_client = queue_client
+        self.codec = codec or MessageCodec()
+        self.max_message_size = max_message_size
+        self.max_records = max_records
+        self.linger = linger
+        self.on_error = on_error
+        self.stats = BatchingStats()
+        self._records = []
+        self._size = 0
+        self._deadline = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._flusher = threading.Thread(target=self._linger_loop, daemon=True)
+        self._flusher.start()
+
+    # Largest message text an envelope of payload_size serialized bytes can encode to:
+    # the codec header, base64 expansion of 4/3, and the envelope framing.
+    def _wire_size(self, payload_size):
+        return 4 * ((payload_size + len(BATCH_KEY) + 8 + HEADER_SIZE + 2) // 3)
+
+    # Adds a record, sending the buffered records first when the record would not fit with them.
+    def add(self, record):
+        record_size = len(self.codec.serializer.dumps(record)) + 1
+        if self._wire_size(record_size) > self.max_message_size:
+            raise MessageTooLargeError(self._wire_size(record_size), self.max_message_size)
+
+        to_send = []
+        with self._condition:
+            if self._closed:
+                raise ValueError('The producer is closed')
+            if self._records and self._wire_size(self._size + record_size) > self.max_message_size:
+                to_send.append(self._take())
+            self._records.append(record)
+            self._size += record_size
+            if self.max_records is not None and len(self._records) >= self.max_records:
+                to_send.append(self._take())
+            elif len(self._records) == 1:
+                self._deadline = time.monotonic() + self.linger
+                self._condition.notify()
+
+        for records in to_send:
+            self._send(records)
+
+    # Sends the buffered records now.
+    def flush(self):
+        with self._condition:
+            to_send = self._take()
+        if to_send:
+            self._send(to_send)
+
+    # Sends the buffered records and stops the linger timer.
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._flusher.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Must be called with the lock held
+    def _take(self):
+        records = self._records
+        self._records = []
+        self._size = 0
+        self._deadline = None
+        return records
+
+    def _send(self, records):
+        try:
+            self.queue_client.send_message(self.codec.encode({BATCH_KEY: records}))
+        except Exception as e:
+            with self._lock:
+                self.stats.failed_messages += 1
+                self.stats.failed_records += len(records)
+            if self.on_error is not None:
+                self.on_error(records, e)
+            return
+        with self._lock:
+            self.stats.messages += 1
+            self.stats.records += len(records)
+
+    def _linger_loop(self):
+        while True:
+            with self._condition:
+                while not self._closed and (self._deadline is None or self._deadline > time.monotonic()):
+                    timeout = None if self._deadline is None else self._deadline - time.monotonic()
+                    self._condition.wait(timeout)
+                if self._closed:
+                    return
+                to_send = self._take()
+            if to_send:
+                self._send(to_send)
+
+# Receives envelopes and yields the records packed in them.
+class BatchingConsumer():
+
+    # Input Arguments:
+    # queue_client - QueueClient to receive the envelopes from
+    # codec - MessageCodec used to decode envelopes; any MessageCodec decodes any envelope
+    def __init__(self, queue_client, codec=None):
+        self.queue_client = queue_client
+        self.codec = codec or MessageCodec()
+
+    # Yields records until the queue is empty. A message is deleted when the generator is resumed
+    # after its last record, so records of a message that was not fully consumed are redelivered.
+    def records(self, batch_size=MAX_MESSAGES_PER_RECEIVE, visibility_timeout=None):
+        while True:
+            messages = receive_batch(self.queue_client, batch_size, visibility_timeout)
+            if not messages:
+                return
+            for message in messages:
+                for record in unpack_records(self.codec.decode(message.content)):
+                    yield record
+                self.queue_client.delete_message(message=message.id, pop_receipt=message.pop_receipt)
+
+# Compares queue transactions per record with and without batching against the local stand-in.
+def run_benchmark(record_count=10000):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_service = LocalQueueServiceClient()
+    queue_client = queue_service.create_queue('benchmarkqueue')
+    records = [{'id': i, 'event': 'page-view', 'url': '/products/' + str(i % 500), 'user': 'user' + str(i % 97),
+                'payload': 'x' * 150} for i in range(record_count)]
+
+    start = time.perf_counter()
+    with BatchingProducer(queue_client) as producer:
+        for record in records:
+            producer.add(record)
+    elapsed = time.perf_counter() - start
+    print('Produced {0} records in {1} messages ({2:.1f} records per message) in {3:.2f}s'.format(
+        producer.stats.records, producer.stats.messages, producer.stats.records_per_message, elapsed))
+
+    consumed = sum(1 for record in BatchingConsumer(queue_client).records())
+    print('Consumed {0} records, {1:.3f} queue transactions per record instead of 3 (send, receive, delete)'.format(
+        consumed, 3.0 * producer.stats.messages / consumed))
+
+if __name__ == '__main__':
+    run_benchmark()
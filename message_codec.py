@@ -0,0 +1,301 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.core.paging import ItemPaged
+import base64
+import json
+import struct
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# -------------------------------------------------------------
+# <summary>
+# Codec pipeline for queue messages. A message is serialized (text, JSON or msgpack), optionally
+# compressed (zlib or lz4) when larger than a threshold, prefixed with an eight byte header (two magic
+# bytes, a version, the serializer and compressor ids, and a CRC-32 of the payload), and base64 encoded
+# so it can be sent as message text. Because every message names its own format, a consumer can decode messages written
+# by producers using different codecs. Messages without a header, and text that only looks like
+# one but does not decode, are returned unchanged.
+#
+# msgpack and lz4 are optional packages; their codecs are only available when installed.
+# </summary>
+# -------------------------------------------------------------
+
+# Largest message the service accepts, in bytes of message text.
+MAX_MESSAGE_SIZE = 64 * 1024
+
+# First bytes of every encoded message, followed by the header version, the format byte and the
+# CRC-32 of the payload. Plain text can start with the base64 of the magic and version, but it is
+# only decoded when the checksum matches too, which stray text does about once in 2 ** 32.
+HEADER_MAGIC = b'\xfb\x9c'
+HEADER_VERSION = 1
+_CHECKSUM = struct.Struct('>I')
+HEADER_SIZE = len(HEADER_MAGIC) + 2 + _CHECKSUM.size
+
+# Base64 text every encoded message starts with: the encoding of the magic and version bytes.
+_HEADER_TEXT = base64.b64encode(HEADER_MAGIC + bytes((HEADER_VERSION,))).decode('ascii')
+
+# Returns the length of the message text encode produces for a payload of payload_size bytes,
+# serialized and not compressed: the header and payload grow by 4/3 in base64.
+def encoded_size(payload_size):
+    return 4 * ((HEADER_SIZE + payload_size + 2) // 3)
+
+# Raised when an encoded message does not fit in a queue message.
+class MessageTooLargeError(ValueError):
+
+    def __init__(self, size, limit=MAX_MESSAGE_SIZE):
+        super(MessageTooLargeError, self).__init__(
+            'Encoded message is {0} bytes, the queue accepts at most {1} bytes'.format(size, limit))
+        self.size = size
+        self.limit = limit
+
+class TextSerializer():
+    format_id = 0
+    name = 'text'
+
+    def dumps(self, value):
+        return value.encode('utf-8')
+
+    def loads(self, data):
+        return data.decode('utf-8')
+
+class BytesSerializer():
+    format_id = 1
+    name = 'bytes'
+
+    def dumps(self, value):
+        return bytes(value)
+
+    def loads(self, data):
+        return data
+
+class JsonSerializer():
+    format_id = 2
+    name = 'json'
+
+    def dumps(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+class MsgpackSerializer():
+    format_id = 3
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError('The msgpack package is not installed')
+
+    def dumps(self, value):
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+class ZlibCompressor():
+    compression_id = 1
+    name = 'zlib'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+class Lz4Compressor():
+    compression_id = 2
+    name = 'lz4'
+
+    def __init__(self):
+        if lz4 is None:
+            raise ValueError('The lz4 package is not installed')
+
+    def compress(self, data):
+        return lz4.frame.compress(data)
+
+    def decompress(self, data):
+        return lz4.frame.decompress(data)
+
+# Looks up the serializer and decompressor named in a message header.
+def serializer_for(format_id):
+    for serializer in (TextSerializer, BytesSerializer, JsonSerializer, MsgpackSerializer):
+        if serializer.format_id == format_id:
+            return serializer()
+    raise ValueError('Unknown message format {0}'.format(format_id))
+
+def compressor_for(compression_id):
+    for compressor in (ZlibCompressor, Lz4Compressor):
+        if compressor.compression_id == compression_id:
+            return compressor()
+    raise ValueError('Unknown message compression {0}'.format(compression_id))
+
+# Serializes, compresses and frames messages, and decodes messages written by any MessageCodec.
+class MessageCodec():
+
+    # Input Arguments:
+    # serializer - serializer used for encoding, JsonSerializer when not given
+    # compressor - optional compressor applied to serialized payloads
+    # compress_threshold - serialized payloads smaller than this many bytes are not compressed
+    def __init__(self, serializer=None, compressor=None, compress_threshold=256):
+        self.serializer = serializer or JsonSerializer()
+        self.compressor = compressor
+        self.compress_threshold = compress_threshold
+
+    @property
+    def name(self):
+        if self.compressor is None:
+            return self.serializer.name
+        return self.serializer.name + '+' + self.compressor.name
+
+    # Returns the message text for value.
+    def encode(self, value):
+        return self.encode_payload(self.serializer.dumps(value))
+
+    # Returns the message text for a payload already serialized with this codec's serializer.
+    def encode_payload(self, payload):
+        compression_id = 0
+        if self.compressor is not None and len(payload) >= self.compress_threshold:
+            compressed = self.compressor.compress(payload)
+            # keep the original when compression does not pay for itself
+            if len(compressed) < len(payload):
+                payload = compressed
+                compression_id = self.compressor.compression_id
+        header = HEADER_MAGIC + bytes((HEADER_VERSION, self.serializer.format_id << 4 | compression_id))
+        header += _CHECKSUM.pack(zlib.crc32(payload))
+        return base64.b64encode(header + payload).decode('ascii')
+
+    # Returns the value of message text written by encode, or the text itself when it has no header.
+    # Text that starts like an encoded message but fails the checksum, names an unknown format or
+    # compression, or whose payload does not decompress or deserialize, is plain text too, so one odd message never fails
+    # a whole page of received messages.
+    def decode(self, text):
+        if not isinstance(text, str) or not text.startswith(_HEADER_TEXT):
+            return text
+        try:
+            data = base64.b64decode(text, validate=True)
+            if len(data) < HEADER_SIZE:
+                return text
+            format_byte = data[len(HEADER_MAGIC) + 1]
+            payload = data[HEADER_SIZE:]
+            if _CHECKSUM.unpack_from(data, len(HEADER_MAGIC) + 2)[0] != zlib.crc32(payload):
+                return text
+            compression_id = format_byte & 0x0F
+            if compression_id:
+                payload = compressor_for(compression_id).decompress(payload)
+            return serializer_for(format_byte >> 4).loads(payload)
+        except Exception:
+            return text
+
+    # Replaces the content of a received or peeked QueueMessage with its decoded value.
+    def decode_message(self, message):
+        message.content = self.decode(message.content)
+        return message
+
+# Wraps a QueueClient so that messages are encoded on send and decoded on receive and peek.
+# All other QueueClient operations are passed through unchanged.
+class CodecQueueClient():
+
+    def __init__(self, queue_client, codec=None):
+        self.queue_client = queue_client
+        self.codec = codec or MessageCodec()
+
+    def __getattr__(self, name):
+        return getattr(self.queue_client, name)
+
+    def send_message(self, content, **kwargs):
+        text = self.codec.encode(content)
+        if len(text) > MAX_MESSAGE_SIZE:
+            raise MessageTooLargeError(len(text))
+        return self.queue_client.send_message(text, **kwargs)
+
+    def receive_messages(self, **kwargs):
+        pages = self.queue_client.receive_messages(**kwargs).by_page()
+
+        def get_next(continuation_token):
+            return [self._decode_message(message) for message in next(pages, [])]
+
+        def extract_data(messages):
+            if not messages:
+                raise StopIteration('End of paging')
+            return 'TOKEN_IGNORED', iter(messages)
+
+        return ItemPaged(get_next, extract_data)
+
+    def _decode_message(self, message):
+        return self.codec.decode_message(message)
+
+    def peek_messages(self, max_messages=None, **kwargs):
+        return [self._decode_message(message) for message in self.queue_client.peek_messages(max_messages, **kwargs)]
+
+    def update_message(self, message, pop_receipt=None, content=None, **kwargs):
+        if content is not None:
+            content = self.codec.encode(content)
+        return self.queue_client.update_message(message, pop_receipt=pop_receipt, content=content, **kwargs)
+
+# Returns one MessageCodec for every combination available in this environment.
+def available_codecs(compress_threshold=256):
+    serializers = [JsonSerializer()]
+    compressors = [ZlibCompressor()]
+    if msgpack is not None:
+        serializers.append(MsgpackSerializer())
+    if lz4 is not None:
+        compressors.append(Lz4Compressor())
+    codecs = []
+    for serializer in serializers:
+        codecs.append(MessageCodec(serializer))
+        for compressor in compressors:
+            codecs.append(MessageCodec(serializer, compressor, compress_threshold))
+    return codecs
+
+# Reports bytes on the wire and encode/decode time per message for every available codec.
+def run_benchmark(iterations=2000):
+    record = {
+        'id': 123456,
+        'event': 'order-created',
+        'customer': 'contoso',
+        'items': [{'sku': 'sku-' + str(i), 'quantity': i, 'price': 9.99} for i in range(20)],
+        'tags': ['priority', 'retail', 'web'],
+    }
+    plain_size = len(str(record))
+    print('{0:<14} {1:>10} {2:>12} {3:>12}'.format('codec', 'wire bytes', 'encode us', 'decode us'))
+    print('{0:<14} {1:>10} {2:>12} {3:>12}'.format('str()', plain_size, '-', '-'))
+    for codec in available_codecs():
+        start = time.perf_counter()
+        for i in range(iterations):
+            text = codec.encode(record)
+        encode_time = (time.perf_counter() - start) / iterations
+        start = time.perf_counter()
+        for i in range(iterations):
+            codec.decode(text)
+        decode_time = (time.perf_counter() - start) / iterations
+        print('{0:<14} {1:>10} {2:>12.1f} {3:>12.1f}'.format(codec.name, len(text), encode_time * 1e6, decode_time * 1e6))
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,173 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import threading
+import time
+
+# Visibility lease on a received message. Every renewal returns a new pop receipt, so the
+# message must be deleted with lease.pop_receipt rather than the one it was received with.
+class MessageLease():
+
+    # received_at is the time.monotonic() at which the receive call was made, when the visibility timeout started
+    def __init__(self, manager, message, visibility_timeout, renew_margin, received_at=None):
+        self.manager = manager
+        self.message_id = message.id
+        self.pop_receipt = message.pop_receipt
+        self.visibility_timeout = visibility_timeout
+        self.renew_margin = renew_margin
+        self.started = received_at if received_at is not None else time.monotonic()
+        self.expires = self.started + visibility_timeout
+        self.renewals = 0
+        self.active = True
+        self.lost = False
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def renew_at(self):
+        return self.expires - self.renew_margin
+
+    # Stops renewing the lease. The message becomes visible again when the current timeout expires.
+    def release(self):
+        self.manager.release(self)
+
+    # Stops renewing the lease and deletes the message with the latest pop receipt.
+    def complete(self):
+        self.manager.complete(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+# -------------------------------------------------------------
+# <summary>
+# Keeps received messages invisible while their handlers run by renewing the visibility timeout
+# with update_message shortly before it expires. All leases share one scheduler thread that waits
+# on a heap of renewal deadlines; the renewal calls themselves run on a small thread pool so a slow
+# call does not delay the others. Short visibility timeouts can then be used, so messages of a
+# crashed consumer are redelivered quickly while healthy long running handlers keep their message.
+# </summary>
+# -------------------------------------------------------------
+class MessageLeaseManager():
+
+    # Input Arguments:
+    # queue_client - QueueClient the messages were received from
+    # visibility_timeout - seconds each renewal extends the lease by
+    # renew_margin - seconds before expiry the lease is renewed, defaults to a third of the timeout
+    # max_lease_time - seconds after which a lease is no longer renewed, None to renew until released
+    # renew_concurrency - number of threads issuing update_message calls
+    # on_lost - optional callable invoked with a lease whose renewal failed
+    def __init__(self, queue_client, visibility_timeout=30, renew_margin=None, max_lease_time=None,
+                 renew_concurrency=4, on_lost=None):
+        self.queue_client = queue_client
+        self.visibility_timeout = visibility_timeout
+        self.renew_margin = renew_margin
+        self.max_lease_time = max_lease_time
+        self.on_lost = on_lost
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._renewers = ThreadPoolExecutor(max_workers=renew_concurrency)
+        self._scheduler = threading.Thread(target=self._schedule_loop, daemon=True)
+        self._scheduler.start()
+
+    # Starts renewing a received message. Track messages as soon as they are received: the visibility
+    # timeout runs from the receive call, not from when a handler picks the message up.
+    # Input Arguments:
+    # visibility_timeout - the timeout the message was received with
+    # received_at - time.monotonic() taken just before the receive call, now when None
+    def track(self, message, visibility_timeout=None, received_at=None):
+        visibility_timeout = visibility_timeout or self.visibility_timeout
+        renew_margin = self.renew_margin if self.renew_margin is not None else visibility_timeout / 3.0
+        lease = MessageLease(self, message, visibility_timeout, renew_margin, received_at)
+        self._schedule(lease)
+        return lease
+
+    def release(self, lease):
+        with lease._lock:
+            lease.active = False
+
+    def complete(self, lease):
+        with lease._lock:
+            lease.active = False
+            self.queue_client.delete_message(message=lease.message_id, pop_receipt=lease.pop_receipt)
+
+    # Stops the scheduler. Leases still active are no longer renewed.
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._scheduler.join()
+        self._renewers.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _schedule(self, lease):
+        with self._condition:
+            heapq.heappush(self._heap, (lease.renew_at, next(self._counter), lease))
+            self._condition.notify()
+
+    def _schedule_loop(self):
+        with self._condition:
+            while not self._closed:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                renew_at, _, lease = self._heap[0]
+                delay = renew_at - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if lease.active:
+                    self._renewers.submit(self._renew, lease)
+
+    def _renew(self, lease):
+        with lease._lock:
+            if not lease.active:
+                return
+            if self.max_lease_time is not None and time.monotonic() - lease.started >= self.max_lease_time:
+                lease.active = False
+                return
+            # the new timeout runs from the call, so expiry is measured from before it
+            renewed_at = time.monotonic()
+            try:
+                updated = self.queue_client.update_message(
+                    message=lease.message_id, pop_receipt=lease.pop_receipt, visibility_timeout=lease.visibility_timeout)
+            except Exception as e:
+                lease.active = False
+                lease.lost = True
+                lease.error = e
+            else:
+                lease.pop_receipt = updated.pop_receipt
+                lease.expires = renewed_at + lease.visibility_timeout
+                lease.renewals += 1
+
+        if lease.lost:
+            if self.on_lost is not None:
+                self.on_lost(lease)
+        else:
+            self._schedule(lease)
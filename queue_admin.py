@@ -0,0 +1,248 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import random
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Bulk queue administration. BulkQueueAdmin creates, deletes, clears, or sets the metadata or
+# access policy of many queues, given as an explicit list of names or as a name prefix. Operations
+# run on a bounded number of threads, and a token bucket limits how many start per second so that
+# provisioning thousands of queues stays under the throttling limits of the storage account.
+# Operations that fail with 503 Server Busy are retried after an exponential backoff with full
+# jitter. The SDK retry policy already retries every request a few times; this retry covers
+# throttling that outlasts those retries. Every run returns a BulkAdminReport with the result of
+# each queue, and an optional progress callback is called as queues complete.
+# </summary>
+# -------------------------------------------------------------
+
+# Status codes of the errors that are retried.
+RETRY_STATUS_CODES = (503,)
+
+# Returns the names prefix + '0' to prefix + str(count - 1), the naming used by create_queues_with_prefix.
+def prefixed_names(prefix, count):
+    return [prefix + str(i) for i in range(count)]
+
+# Creates the queues queue_prefix + '0' to queue_prefix + str(count - 1) with a BulkQueueAdmin and
+# returns their QueueClients. Raises the error of the first queue that could not be created.
+# Input Arguments:
+# concurrency - maximum number of queues created at the same time
+# admin_kwargs - further BulkQueueAdmin options, e.g. rate
+def create_queues_with_prefix(queue_service, queue_prefix, count, concurrency=16, metadata=None, **admin_kwargs):
+    queue_names = prefixed_names(queue_prefix, count)
+    BulkQueueAdmin(queue_service, concurrency, **admin_kwargs).create_queues(queue_names, metadata).raise_for_failures()
+    return [queue_service.get_queue_client(queue_name) for queue_name in queue_names]
+
+# Deletes the queues queue_prefix + '0' to queue_prefix + str(count - 1) with a BulkQueueAdmin and
+# returns their names. Only those queues are deleted, never other queues whose name happens to start
+# with queue_prefix. Raises the error of the first queue that could not be deleted.
+def delete_queues_with_prefix(queue_service, queue_prefix, count, concurrency=16, **admin_kwargs):
+    queue_names = prefixed_names(queue_prefix, count)
+    BulkQueueAdmin(queue_service, concurrency, **admin_kwargs).delete_queues(queue_names).raise_for_failures()
+    return queue_names
+
+# Token bucket rate limiter: acquire() returns at once while tokens are left, and otherwise
+# waits for the next token. Tokens are added at rate per second, up to burst.
+class TokenBucket():
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            # taking the token even when there is none reserves the next one, so waiters are served in order
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+# Result of an operation on one queue.
+class AdminResult():
+
+    def __init__(self, queue_name, attempts, elapsed, error=None):
+        self.queue_name = queue_name
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+# Results of a bulk operation, in the order of the queue names.
+class BulkAdminReport():
+
+    def __init__(self, operation, results, elapsed):
+        self.operation = operation
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.succeeded]
+
+    @property
+    def retries(self):
+        return sum(result.attempts - 1 for result in self.results)
+
+    # Raises the error of the first queue the operation failed for, if any.
+    def raise_for_failures(self):
+        failed = self.failed
+        if failed:
+            raise failed[0].error
+
+    def summary(self):
+        return '{0}: {1} queues, {2} succeeded, {3} failed, {4} retries in {5:.2f}s'.format(
+            self.operation, len(self.results), len(self.succeeded), len(self.failed), self.retries, self.elapsed)
+
+class BulkQueueAdmin():
+
+    # Input Arguments:
+    # queue_service - QueueServiceClient of the queues
+    # concurrency - maximum number of operations in flight
+    # rate - maximum number of operations started per second, including retries, None for no limit
+    # burst - operations that may start at once after an idle period, rate / 10 by default
+    # max_attempts - attempts per queue before a retryable error is reported
+    # base_backoff, max_backoff - bounds in seconds of the backoff before a retry
+    # progress - optional callable invoked with (completed, total, result) as each queue completes
+    # seed - seed for the backoff jitter, for reproducible runs
+    def __init__(self, queue_service, concurrency=16, rate=None, burst=None, max_attempts=5, base_backoff=0.5,
+                 max_backoff=30.0, progress=None, seed=None):
+        self.queue_service = queue_service
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate, burst) if rate is not None else None
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.progress = progress
+        self._random = random.Random(seed)
+
+    # Creates the queues, given by name; use prefixed_names for numbered queues.
+    def create_queues(self, queue_names, metadata=None):
+        return self.run('create', queue_names, lambda queue_client: queue_client.create_queue(metadata=metadata))
+
+    # Deletes the queues given by name, or every queue whose name starts with prefix.
+    def delete_queues(self, queue_names=None, prefix=None):
+        # a 503 can hide a delete that went through, so a retry finding the queue gone has succeeded
+        return self.run('delete', self._resolve(queue_names, prefix), lambda queue_client: queue_client.delete_queue(),
+                        done_on_retry=(ResourceNotFoundError,))
+
+    # Deletes all messages of the queues given by name or prefix.
+    def clear_queues(self, queue_names=None, prefix=None):
+        return self.run('clear', self._resolve(queue_names, prefix), lambda queue_client: queue_client.clear_messages())
+
+    # Replaces the metadata of the queues given by name or prefix.
+    def set_metadata(self, metadata, queue_names=None, prefix=None):
+        return self.run('set_metadata', self._resolve(queue_names, prefix),
+                        lambda queue_client: queue_client.set_queue_metadata(metadata=metadata))
+
+    # Replaces the stored access policies of the queues given by name or prefix; an empty dict removes them.
+    def set_access_policy(self, signed_identifiers, queue_names=None, prefix=None):
+        return self.run('set_access_policy', self._resolve(queue_names, prefix),
+                        lambda queue_client: queue_client.set_queue_access_policy(signed_identifiers=signed_identifiers))
+
+    def _resolve(self, queue_names, prefix):
+        if (queue_names is None) == (prefix is None):
+            raise ValueError('Pass either queue_names or prefix')
+        if prefix is not None:
+            return [queue.name for queue in self.queue_service.list_queues(prefix)]
+        return list(queue_names)
+
+    # Applies operation, a callable taking a QueueClient, to every queue and returns a BulkAdminReport named name.
+    # done_on_retry - exception types that mean the operation already took effect when a retry raises them
+    def run(self, name, queue_names, operation, done_on_retry=()):
+        queue_names = list(queue_names)
+        start = time.monotonic()
+        results = [None] * len(queue_names)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self._apply, queue_name, operation, done_on_retry): index
+                       for index, queue_name in enumerate(queue_names)}
+            for completed, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = result = future.result()
+                if self.progress is not None:
+                    self.progress(completed, len(queue_names), result)
+        return BulkAdminReport(name, results, time.monotonic() - start)
+
+    def _apply(self, queue_name, operation, done_on_retry):
+        queue_client = self.queue_service.get_queue_client(queue_name)
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                operation(queue_client)
+                return AdminResult(queue_name, attempt, time.monotonic() - start)
+            except done_on_retry as e:
+                if attempt == 1:
+                    return AdminResult(queue_name, attempt, time.monotonic() - start, e)
+                return AdminResult(queue_name, attempt, time.monotonic() - start)
+            except HttpResponseError as e:
+                if getattr(e, 'status_code', None) not in RETRY_STATUS_CODES or attempt >= self.max_attempts:
+                    return AdminResult(queue_name, attempt, time.monotonic() - start, e)
+            except Exception as e:
+                return AdminResult(queue_name, attempt, time.monotonic() - start, e)
+            time.sleep(self._random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))))
+
+# Prints the progress of a bulk operation every step queues.
+def print_progress(step=100):
+    def progress(completed, total, result):
+        if completed % step == 0 or completed == total:
+            print('  {0}/{1} queues done'.format(completed, total))
+    return progress
+
+# Provisions and tears down queues on the local stand-in with 5% of the calls failing with
+# Server Busy, once with sequential loops and once with BulkQueueAdmin.
+def run_benchmark(queue_count=1000, latency=0.01, failure_rate=0.05):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_names = prefixed_names('benchmarkqueue', queue_count)
+    queue_service = LocalQueueServiceClient(latency=latency, failure_rate=failure_rate, seed=1)
+    start = time.monotonic()
+    failures = 0
+    for operation in (queue_service.create_queue, queue_service.delete_queue):
+        for queue_name in queue_names:
+            try:
+                operation(queue_name)
+            except HttpResponseError:
+                failures += 1
+    print('sequential loops: create and delete in {0:6.2f}s, {1} failed'.format(time.monotonic() - start, failures))
+
+    queue_service = LocalQueueServiceClient(latency=latency, failure_rate=failure_rate, seed=1)
+    admin = BulkQueueAdmin(queue_service, concurrency=32, rate=2000, base_backoff=0.05, seed=1)
+    for report in (admin.create_queues(queue_names), admin.delete_queues(prefix='benchmarkqueue')):
+        print('BulkQueueAdmin:  ', report.summary())
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -16,6 +16,7 @@
 
 from azure.storage.queue import QueueServiceClient, QueueSasPermissions
 from azure.storage.queue import CorsRule, Metrics, RetentionPolicy, AccessPolicy, QueueAnalyticsLogging
+from queue_admin import create_queues_with_prefix, delete_queues_with_prefix
 from random_data import RandomData
 import datetime
 
@@ -41,12 +42,14 @@ class QueueAdvancedSamples():
         self.random_data = RandomData()
 
     # Runs all samples for Azure Storage Queue service.
-    def run_all_samples(self, connection_string):
+    # A queue_service, such as the local stand-in from local_queue_service, can be passed instead of a connection string.
+    def run_all_samples(self, connection_string, queue_service=None):
         try:
             print('Azure Storage Advanced Queue samples - Starting.')
 
             # create a new queue service that can be passed to all methods
-            queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
+            if queue_service is None:
+                queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
 
             print('\n\n* List queues *\n')
             self.list_queues(queue_service)
@@ -75,8 +78,7 @@ class QueueAdvancedSamples():
         try:
             print('1. Create multiple queues with prefix: ', queue_prefix)
             
-            for i in range(5):
-                queue_service.create_queue(queue_prefix + str(i))
+            create_queues_with_prefix(queue_service, queue_prefix, 5)
             
             print('2. List queues with prefix: ', queue_prefix)
             
@@ -87,8 +89,7 @@ class QueueAdvancedSamples():
 
         finally:                
             print('3. Delete queues with prefix:' + queue_prefix) 
-            for i in range(5):
-                queue_service.delete_queue(queue_prefix + str(i))
+            delete_queues_with_prefix(queue_service, queue_prefix, 5)
     
         print("List queues sample completed")
     
@@ -0,0 +1,189 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.storage.queue.aio import QueueServiceClient
+from azure.storage.queue import QueueSasPermissions
+from azure.storage.queue import CorsRule, Metrics, RetentionPolicy, AccessPolicy, QueueAnalyticsLogging
+from queue_basic_samples_async import gather_with_limit
+from random_data import RandomData
+import datetime
+
+# -------------------------------------------------------------
+# <summary>
+# Azure Queue Service Sample - asyncio version of QueueAdvancedSamples built on azure.storage.queue.aio.
+# Independent operations, such as creating and deleting the prefixed queues, are issued
+# concurrently from a single event loop with a bounded number in flight.
+#
+# Documentation References:
+# - Queue Service Python API - https://docs.microsoft.com/en-us/python/api/azure-storage-queue/azure.storage.queue.aio
+# </summary>
+# -------------------------------------------------------------
+
+class AsyncQueueAdvancedSamples():
+
+    # Input Arguments:
+    # concurrency - maximum number of service operations awaited at the same time
+    def __init__(self, concurrency=16):
+        self.random_data = RandomData()
+        self.concurrency = concurrency
+
+    # Runs all samples for Azure Storage Queue service.
+    # A queue_service, such as AsyncLocalQueueServiceClient from local_queue_service, can be passed instead of a connection string.
+    async def run_all_samples(self, connection_string, queue_service=None):
+        print('Azure Storage Advanced Queue samples (async) - Starting.')
+
+        # create a new queue service that can be passed to all methods
+        if queue_service is None:
+            queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
+        async with queue_service:
+            try:
+                print('\n\n* List queues *\n')
+                await self.list_queues(queue_service)
+
+                print('\n\n* Set cors Rules *\n')
+                await self.set_cors_rules(queue_service)
+
+                print('\n\n* ACL operations *\n')
+                await self.queue_acl_operations(queue_service)
+
+                print('\n\n* Set service logging and metrics properties *\n')
+                await self.set_service_properties(queue_service)
+
+                print('\n\n* Set queue metadata *\n')
+                await self.metadata_operations(queue_service)
+
+            except Exception as e:
+                print('Error occurred in the sample.', e)
+            finally:
+                print('\nAzure Storage Advanced Queue samples (async) - Completed\n')
+
+    # Manage queues including, creating, listing and deleting
+    async def list_queues(self, queue_service):
+        queue_prefix = "queuesample" + self.random_data.get_random_name(6)
+
+        try:
+            print('1. Create multiple queues with prefix: ', queue_prefix)
+
+            await gather_with_limit(self.concurrency, (queue_service.create_queue(queue_prefix + str(i)) for i in range(5)))
+
+            print('2. List queues with prefix: ', queue_prefix)
+
+            async for queue in queue_service.list_queues(queue_prefix):
+                print('  Queue name:' + queue.name)
+
+        finally:
+            print('3. Delete queues with prefix:' + queue_prefix)
+            await gather_with_limit(self.concurrency,
+                (queue_service.delete_queue(queue_prefix + str(i)) for i in range(5)), return_exceptions=True)
+
+        print("List queues sample completed")
+
+    # Manage CORS rules
+    async def set_cors_rules(self, queue_service):
+
+        cors_rule = CorsRule(
+            allowed_origins=['*'],
+            allowed_methods=['POST', 'GET'],
+            allowed_headers=['*'],
+            exposed_headers=['*'],
+            max_age_in_seconds=3600)
+
+        print('1. Get Cors Rules')
+        original_cors_rules = (await queue_service.get_service_properties())['cors']
+
+        try:
+            print('2. Overwrite Cors Rules')
+            await queue_service.set_service_properties(cors=[cors_rule])
+
+        except Exception as e:
+            print(e)
+
+        finally:
+            print('3. Revert Cors Rules back the original ones')
+            #reverting cors rules back to the original ones
+            await queue_service.set_service_properties(cors=original_cors_rules)
+
+        print("CORS sample completed")
+
+    # Manage properties of the Queue service, including logging and metrics settings, and the default service version.
+    async def set_service_properties(self, queue_service):
+
+        print('1. Get Queue service properties')
+        props = await queue_service.get_service_properties()
+
+        try:
+            retention = RetentionPolicy(enabled=True, days=5)
+            logging = QueueAnalyticsLogging(delete=True, read=False, write=True, retention_policy=retention)
+            hour_metrics = Metrics(enabled=True, include_apis=True, retention_policy=retention)
+            minute_metrics = Metrics(enabled=False)
+
+            print('2. Ovewrite Queue service properties')
+            await queue_service.set_service_properties(analytics_logging=logging, hour_metrics=hour_metrics, minute_metrics=minute_metrics)
+        finally:
+            print('3. Revert Queue service properties back to the original ones')
+            await queue_service.set_service_properties(analytics_logging=props['analytics_logging'], hour_metrics=props['hour_metrics'], minute_metrics=props['minute_metrics'])
+
+        print('4. Set Queue service properties completed')
+
+    # Manage metadata of a queue
+    async def metadata_operations(self, queue_service):
+        queue_name = 'queue' + self.random_data.get_random_name(6)
+
+        # Create a new queue
+        print('1. Create a queue with custom metadata - ' + queue_name)
+        queue_client = await queue_service.create_queue(queue_name, {'category':'azure-storage', 'type': 'queue-sample'})
+
+        try:
+            # Get all the queue metadata
+            print('2. Get queue metadata')
+            metadata = (await queue_client.get_queue_properties()).metadata
+
+            print('    Metadata:')
+            for key in metadata:
+                print('        ' + key + ':' + metadata[key])
+
+        finally:
+            # Delete the queue
+            print("3. Delete Queue")
+            await queue_client.delete_queue()
+
+    # Manage access policy of a queue
+    async def queue_acl_operations(self, queue_service):
+        queue_name = 'aclqueue' + self.random_data.get_random_name(6)
+
+        print('1. Create a queue with name - ' + queue_name)
+        queue_client = await queue_service.create_queue(queue_name)
+
+        try:
+            print('2. Set access policy for queue')
+            access_policy = AccessPolicy(permission=QueueSasPermissions(read=True),
+                                        expiry=datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+                                        start=datetime.datetime.utcnow())
+            identifiers = {'id': access_policy}
+            await queue_client.set_queue_access_policy(signed_identifiers=identifiers)
+
+            print('3. Get access policy from queue')
+            acl = await queue_client.get_queue_access_policy()
+
+            print('4. Clear access policy in queue')
+            # Clear
+            await queue_client.set_queue_access_policy({})
+
+        finally:
+            print('5. Delete queue')
+            await queue_client.delete_queue()
+
+        print("Queue ACL operations sample completed")
@@ -15,6 +15,7 @@
 #----------------------------------------------------------------------------------
 
 from random_data import RandomData
+from queue_producer import send_messages
 from azure.storage.queue import QueueServiceClient
 
 # -------------------------------------------------------------
@@ -38,7 +39,8 @@ class QueueBasicSamples():
         self.random_data = RandomData()
 
     # Runs all samples for Azure Storage Queue service.
-    def run_all_samples(self, connection_string):
+    # A queue_service, such as the local stand-in from local_queue_service, can be passed instead of a connection string.
+    def run_all_samples(self, connection_string, queue_service=None):
         try:
             print('Azure Storage Basic Queue samples - Starting.')
             
@@ -47,7 +49,8 @@ class QueueBasicSamples():
             queuename2 = "queuesample" + self.random_data.get_random_name(6)
             
             # create a new queue service that can be passed to all methods
-            queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
+            if queue_service is None:
+                queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
 
             # Basic queue operations such as creating a queue and listing all queues in your account
             print('\n\n* Basic queue operations *\n')
@@ -57,6 +60,10 @@ class QueueBasicSamples():
             print('\n\n* Basic message operations *\n')
             self.basic_queue_message_operations(queue_service, queuename)
 
+            # Add many messages to a queue in parallel
+            print('\n\n* Bulk message operations *\n')
+            self.bulk_queue_message_operations(queue_service, queuename)
+
         except Exception as e: 
             print('Error occurred in the sample.', e)
         finally:
@@ -136,6 +143,21 @@ class QueueBasicSamples():
         queue_client.clear_messages()
         print('Successfully cleared out all queue messages')
 
+    # Send a batch of messages concurrently instead of one round trip at a time
+    def bulk_queue_message_operations(self, queue_service, queuename):
+        messagename = "bulk message"
+        queue_client = queue_service.get_queue_client(queuename)
+
+        # The sends are pipelined over a pool of threads sharing the client's connection pool.
+        # Failures are returned per message rather than raised.
+        result = send_messages(queue_client, (messagename + str(i) for i in range(1, 101)), concurrency=8)
+        print('Successfully added {0} messages, {1} failed'.format(len(result.succeeded), len(result.failed)))
+        for failure in result.failed:
+            print('Failed to add message: ', failure.content, failure.error)
+
+        queue_client.clear_messages()
+        print('Successfully cleared out all queue messages')
+
     # Delete the queue
     def delete_queue(self, queue_service, queuename):
         # Delete the queue. 
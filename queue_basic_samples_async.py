@@ -0,0 +1,155 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from random_data import RandomData
+from azure.storage.queue.aio import QueueServiceClient
+import asyncio
+
+# Runs the given coroutines concurrently, allowing at most limit of them to be awaited at the same time.
+# Results are returned in the order of the coroutines, like asyncio.gather.
+async def gather_with_limit(limit, coroutines, return_exceptions=False):
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines), return_exceptions=return_exceptions)
+
+# -------------------------------------------------------------
+# <summary>
+# Azure Queue Service Sample - asyncio version of QueueBasicSamples built on azure.storage.queue.aio.
+# Operations that do not depend on each other, such as creating queues or deleting the received
+# messages, are issued concurrently from a single event loop with a bounded number in flight.
+#
+# Documentation References:
+# - Queue Service Python API - https://docs.microsoft.com/en-us/python/api/azure-storage-queue/azure.storage.queue.aio
+# </summary>
+# -------------------------------------------------------------
+class AsyncQueueBasicSamples():
+
+    # Input Arguments:
+    # concurrency - maximum number of service operations awaited at the same time
+    def __init__(self, concurrency=16):
+        self.random_data = RandomData()
+        self.concurrency = concurrency
+
+    # Runs all samples for Azure Storage Queue service.
+    # A queue_service, such as AsyncLocalQueueServiceClient from local_queue_service, can be passed instead of a connection string.
+    async def run_all_samples(self, connection_string, queue_service=None):
+        print('Azure Storage Basic Queue samples (async) - Starting.')
+
+        # declare variables
+        queuename = "queuesample" + self.random_data.get_random_name(6)
+        queuename2 = "queuesample" + self.random_data.get_random_name(6)
+
+        # create a new queue service that can be passed to all methods
+        if queue_service is None:
+            queue_service = QueueServiceClient.from_connection_string(conn_str=connection_string)
+        async with queue_service:
+            try:
+                # Basic queue operations such as creating a queue and listing all queues in your account
+                print('\n\n* Basic queue operations *\n')
+                await self.basic_queue_operations(queue_service, queuename, queuename2)
+
+                # Add a message to a queue in your account
+                print('\n\n* Basic message operations *\n')
+                await self.basic_queue_message_operations(queue_service, queuename)
+
+                # Add many messages to a queue concurrently
+                print('\n\n* Bulk message operations *\n')
+                await self.bulk_queue_message_operations(queue_service, queuename)
+
+            except Exception as e:
+                print('Error occurred in the sample.', e)
+            finally:
+                # Delete the queues from your account
+                await gather_with_limit(self.concurrency, [
+                    self.delete_queue(queue_service, queuename),
+                    self.delete_queue(queue_service, queuename2)], return_exceptions=True)
+                print('\nAzure Storage Basic Queue samples (async) - Completed.\n')
+
+    # Basic queue operations including creating and listing
+    async def basic_queue_operations(self, queue_service, queuename, queuename2):
+        # Create both queues at the same time
+        print('Attempting create of queues: ', queuename, queuename2)
+        await gather_with_limit(self.concurrency, [
+            queue_service.create_queue(queuename),
+            queue_service.create_queue(queuename2)])
+        print('Successfully created queues: ', queuename, queuename2)
+
+        #List all queues with prefix "queuesample"
+        print('Listing all queues with prefix "queuesample"')
+        async for queue in queue_service.list_queues("queuesample"):
+            print('\t', queue.name)
+
+    # Basic queue operations on messages
+    async def basic_queue_message_operations(self, queue_service, queuename):
+        # Add a number of messages to the queue concurrently.
+        # The service does not guarantee ordering, so sending in parallel does not change the semantics.
+        messagename = "test message"
+        queue_client = queue_service.get_queue_client(queuename)
+        await gather_with_limit(self.concurrency, (queue_client.send_message(messagename + str(i)) for i in range(1, 10)))
+        print('Successfully added 9 messages')
+
+        # Get length of queue
+        queue_properties = await queue_client.get_queue_properties()
+        print('Approximate length of the queue: ', queue_properties.approximate_message_count)
+
+        # Look at the first 5 messages only without dequeueing them
+        messages = await queue_client.peek_messages(max_messages=5)
+        for message in messages:
+            print('Peeked message content is: ', message.content)
+
+        # Update the visibility timeout of a message
+        print('Update the visibility timeout of a message')
+        async for message in queue_client.receive_messages():
+            await queue_client.update_message(message=message.id, pop_receipt=message.pop_receipt, visibility_timeout=300)
+            break
+
+        # Dequeuing messages
+        # Receive a batch of messages, then delete all of them concurrently
+        messages = [message async for message in queue_client.receive_messages(messages_per_page=32)]
+        for message in messages:
+            print('Message for dequeueing is: ', message.content)
+        await gather_with_limit(self.concurrency, (
+            queue_client.delete_message(message=message.id, pop_receipt=message.pop_receipt) for message in messages))
+        print('Successfully dequeued {0} messages'.format(len(messages)))
+
+        # Clear out all messages from the queue
+        await queue_client.clear_messages()
+        print('Successfully cleared out all queue messages')
+
+    # Send a batch of messages concurrently from one event loop
+    async def bulk_queue_message_operations(self, queue_service, queuename):
+        messagename = "bulk message"
+        queue_client = queue_service.get_queue_client(queuename)
+
+        results = await gather_with_limit(self.concurrency,
+            (queue_client.send_message(messagename + str(i)) for i in range(1, 101)), return_exceptions=True)
+        failed = [result for result in results if isinstance(result, Exception)]
+        print('Successfully added {0} messages, {1} failed'.format(len(results) - len(failed), len(failed)))
+
+        await queue_client.clear_messages()
+        print('Successfully cleared out all queue messages')
+
+    # Delete the queue
+    async def delete_queue(self, queue_service, queuename):
+        # Delete the queue.
+        # Warning: This will delete all the messages that are contained in it.
+        print('Attempting delete of queue: ', queuename)
+        await queue_service.delete_queue(queuename)
+        print('Successfully deleted queue: ', queuename)
@@ -0,0 +1,357 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from queue_instrumentation import LatencyHistogram
+from random_data import RandomData
+import asyncio
+import json
+import random
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Throughput and latency benchmark for Azure Queue storage, run with "python start.py bench".
+# Producers send messages for a fixed duration while consumers receive them in batches, extend the
+# visibility of a fraction of them with update_message and delete them. Every message carries its
+# enqueue time so the end-to-end latency from send to processing can be measured. The report holds
+# msgs/s and p50/p95/p99 latency for each operation and is written as JSON, so runs can be compared
+# over time to catch regressions.
+# </summary>
+# -------------------------------------------------------------
+
+OPERATIONS = ('send', 'receive', 'update', 'delete')
+
+# Separates the enqueue timestamp from the padding in benchmark messages.
+TIMESTAMP_SEPARATOR = '|'
+
+# Parses a message size distribution:
+#   fixed:SIZE            every message has SIZE characters
+#   uniform:MIN:MAX       sizes are spread evenly between MIN and MAX
+#   choice:S1,S2,...      sizes are picked from the list
+# Returns a function taking a random.Random and returning a size.
+def parse_size_distribution(spec):
+    kind, _, arguments = spec.partition(':')
+    try:
+        if kind == 'fixed':
+            size = int(arguments)
+            return lambda rand: size
+        if kind == 'uniform':
+            low, high = (int(value) for value in arguments.split(':'))
+            return lambda rand: rand.randint(low, high)
+        if kind == 'choice':
+            sizes = [int(value) for value in arguments.split(',')]
+            return lambda rand: rand.choice(sizes)
+    except ValueError:
+        pass
+    raise ValueError('Invalid message size distribution: ' + spec)
+
+# Latencies, in seconds, and error count of one kind of operation.
+class LatencyRecorder():
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        self.histogram.record(latency)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    # Returns count, errors, rate and latency percentiles in milliseconds.
+    def summary(self, duration):
+        result = self.histogram.summary()
+        result['errors'] = self.errors
+        result['per_second'] = result['count'] / duration if duration else 0.0
+        return result
+
+class BenchmarkConfig():
+
+    # Input Arguments:
+    # duration - seconds producers keep sending
+    # producers - number of concurrent senders
+    # consumers - number of concurrent receivers
+    # batch_size - messages requested per receive call
+    # message_size - size distribution, see parse_size_distribution
+    # update_fraction - fraction of received messages whose visibility is extended once before delete
+    # engine - 'sync' for threads on QueueClient, 'async' for tasks on azure.storage.queue.aio
+    # drain_timeout - seconds consumers keep draining after the producers stopped
+    # seed - seed for message sizes, for reproducible workloads
+    def __init__(self, duration=10.0, producers=8, consumers=8, batch_size=32, message_size='fixed:256',
+                 update_fraction=0.0, engine='sync', drain_timeout=10.0, seed=None):
+        if engine not in ('sync', 'async'):
+            raise ValueError('engine must be sync or async')
+        self.duration = duration
+        self.producers = producers
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.message_size = message_size
+        self.update_fraction = update_fraction
+        self.engine = engine
+        self.drain_timeout = drain_timeout
+        self.seed = seed
+        self.size_distribution = parse_size_distribution(message_size)
+
+    def to_dict(self):
+        return {key: value for key, value in vars(self).items() if key != 'size_distribution'}
+
+# Runs a benchmark workload against one queue and returns the report as a dictionary.
+class QueueBenchmark():
+
+    def __init__(self, config):
+        self.config = config
+        self.recorders = {operation: LatencyRecorder() for operation in OPERATIONS}
+        self.end_to_end = LatencyRecorder()
+        self._random = random.Random(config.seed)
+        # random padding sliced out of a pool, so message contents differ without generating data per message
+        self._payloads = RandomData(config.seed).get_payload_pool(config.size_distribution)
+        self._producing = True
+        self._sent = 0
+        self._processed = 0
+        self._lock = threading.Lock()
+
+    def _next_message(self):
+        header = repr(time.time()) + TIMESTAMP_SEPARATOR
+        with self._lock:
+            size = self.config.size_distribution(self._random)
+            padding = self._payloads.text(max(0, size - len(header)))
+        return header + padding
+
+    def _mark_processed(self, message):
+        sent_at = float(message.content.split(TIMESTAMP_SEPARATOR, 1)[0])
+        self.end_to_end.record(time.time() - sent_at)
+        with self._lock:
+            self._processed += 1
+
+    def _should_update(self):
+        with self._lock:
+            return self._random.random() < self.config.update_fraction
+
+    def _drained(self, deadline):
+        with self._lock:
+            return not self._producing and (self._processed >= self._sent or time.monotonic() >= deadline)
+
+    # Runs the workload with threads on a QueueClient and returns the report.
+    def run(self, queue_client):
+        start = time.monotonic()
+        self._run_sync(queue_client)
+        return self.report(time.monotonic() - start)
+
+    # Runs the workload with tasks on an azure.storage.queue.aio QueueClient and returns the report.
+    async def run_async(self, queue_client):
+        start = time.monotonic()
+        await self._run_async(queue_client)
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        duration = self.config.duration
+        return {
+            'config': self.config.to_dict(),
+            'elapsed_seconds': elapsed,
+            'sent': self._sent,
+            'processed': self._processed,
+            'send_per_second': self._sent / duration,
+            'processed_per_second': self._processed / elapsed if elapsed else 0.0,
+            # only sends stop at duration; consumers keep receiving, updating and deleting while the queue drains
+            'operations': {operation: recorder.summary(duration if operation == 'send' else elapsed)
+                           for operation, recorder in self.recorders.items()},
+            'end_to_end': self.end_to_end.summary(elapsed),
+        }
+
+    def _timed(self, operation, function, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self.recorders[operation].record_error()
+            raise
+        self.recorders[operation].record(time.perf_counter() - start)
+        return result
+
+    def _produce(self, queue_client, stop_at):
+        while time.monotonic() < stop_at:
+            content = self._next_message()
+            try:
+                self._timed('send', queue_client.send_message, content)
+            except Exception:
+                continue
+            with self._lock:
+                self._sent += 1
+
+    def _consume(self, queue_client, deadline_holder):
+        while not self._drained(deadline_holder[0]):
+            try:
+                messages = self._timed('receive', _receive_page, queue_client, self.config.batch_size)
+            except Exception:
+                continue
+            if not messages:
+                time.sleep(0.01)
+                continue
+            for message in messages:
+                pop_receipt = message.pop_receipt
+                try:
+                    if self._should_update():
+                        pop_receipt = self._timed('update', queue_client.update_message, message.id,
+                                                  pop_receipt=pop_receipt, visibility_timeout=30).pop_receipt
+                    self._timed('delete', queue_client.delete_message, message.id, pop_receipt=pop_receipt)
+                except Exception:
+                    continue
+                self._mark_processed(message)
+
+    def _run_sync(self, queue_client):
+        stop_at = time.monotonic() + self.config.duration
+        deadline_holder = [float('inf')]
+        producers = [threading.Thread(target=self._produce, args=(queue_client, stop_at)) for i in range(self.config.producers)]
+        consumers = [threading.Thread(target=self._consume, args=(queue_client, deadline_holder)) for i in range(self.config.consumers)]
+        for thread in producers + consumers:
+            thread.start()
+        for thread in producers:
+            thread.join()
+        with self._lock:
+            deadline_holder[0] = time.monotonic() + self.config.drain_timeout
+            self._producing = False
+        for thread in consumers:
+            thread.join()
+
+    async def _timed_async(self, operation, coroutine):
+        start = time.perf_counter()
+        try:
+            result = await coroutine
+        except Exception:
+            self.recorders[operation].record_error()
+            raise
+        self.recorders[operation].record(time.perf_counter() - start)
+        return result
+
+    async def _produce_async(self, queue_client, stop_at):
+        while time.monotonic() < stop_at:
+            content = self._next_message()
+            try:
+                await self._timed_async('send', queue_client.send_message(content))
+            except Exception:
+                continue
+            self._sent += 1
+
+    async def _consume_async(self, queue_client, deadline_holder):
+        while not self._drained(deadline_holder[0]):
+            try:
+                messages = await self._timed_async('receive', _receive_page_async(queue_client, self.config.batch_size))
+            except Exception:
+                continue
+            if not messages:
+                await asyncio.sleep(0.01)
+                continue
+            await asyncio.gather(*(self._process_async(queue_client, message) for message in messages))
+
+    async def _process_async(self, queue_client, message):
+        pop_receipt = message.pop_receipt
+        try:
+            if self._should_update():
+                updated = await self._timed_async('update', queue_client.update_message(
+                    message.id, pop_receipt=pop_receipt, visibility_timeout=30))
+                pop_receipt = updated.pop_receipt
+            await self._timed_async('delete', queue_client.delete_message(message.id, pop_receipt=pop_receipt))
+        except Exception:
+            return
+        self._mark_processed(message)
+
+    async def _run_async(self, queue_client):
+        stop_at = time.monotonic() + self.config.duration
+        deadline_holder = [float('inf')]
+        producers = [asyncio.ensure_future(self._produce_async(queue_client, stop_at)) for i in range(self.config.producers)]
+        consumers = [asyncio.ensure_future(self._consume_async(queue_client, deadline_holder)) for i in range(self.config.consumers)]
+        await asyncio.gather(*producers)
+        deadline_holder[0] = time.monotonic() + self.config.drain_timeout
+        self._producing = False
+        await asyncio.gather(*consumers)
+
+# Receives one page of messages; receive_messages would keep paging until the queue is empty.
+def _receive_page(queue_client, batch_size):
+    return list(next(queue_client.receive_messages(messages_per_page=batch_size).by_page(), []))
+
+async def _receive_page_async(queue_client, batch_size):
+    pages = queue_client.receive_messages(messages_per_page=batch_size).by_page()
+    try:
+        page = await pages.__anext__()
+    except StopAsyncIteration:
+        return []
+    return [message async for message in page]
+
+# Adds the benchmark options to the start.py argument parser.
+def add_arguments(parser):
+    group = parser.add_argument_group('bench options')
+    group.add_argument('--duration', type=float, default=10.0, help='seconds to keep sending (default 10)')
+    group.add_argument('--producers', type=int, default=8, help='concurrent senders (default 8)')
+    group.add_argument('--consumers', type=int, default=8, help='concurrent receivers (default 8)')
+    group.add_argument('--batch-size', type=int, default=32, help='messages per receive call (default 32)')
+    group.add_argument('--message-size', default='fixed:256',
+                       help='size distribution: fixed:N, uniform:MIN:MAX or choice:N1,N2,... (default fixed:256)')
+    group.add_argument('--update-fraction', type=float, default=0.0,
+                       help='fraction of messages updated once before delete (default 0)')
+    group.add_argument('--seed', type=int, default=None, help='seed for reproducible message sizes')
+    group.add_argument('--latency', type=float, default=0.005,
+                       help='simulated seconds per call with --local (default 0.005)')
+    group.add_argument('--output', default=None, help='file to write the JSON report to (default stdout)')
+
+# Runs the benchmark described by the start.py arguments and writes the JSON report.
+def run_from_arguments(args, connection_string):
+    config = BenchmarkConfig(duration=args.duration, producers=args.producers, consumers=args.consumers,
+                             batch_size=args.batch_size, message_size=args.message_size,
+                             update_fraction=args.update_fraction, engine='async' if args.use_async else 'sync',
+                             seed=args.seed)
+    queue_name = 'benchqueue' + RandomData().get_random_name(6)
+    benchmark = QueueBenchmark(config)
+
+    if args.local:
+        from local_queue_service import LocalQueueServiceClient, AsyncLocalQueueServiceClient
+        local_service = LocalQueueServiceClient(latency=args.latency, jitter=0.2, seed=args.seed)
+        local_service.create_queue(queue_name)
+        if config.engine == 'async':
+            report = asyncio.run(benchmark.run_async(AsyncLocalQueueServiceClient(local_service).get_queue_client(queue_name)))
+        else:
+            report = benchmark.run(local_service.get_queue_client(queue_name))
+    else:
+        from queue_client_factory import QueueClientFactory
+        # one connection per producer and consumer thread, so none of them waits for a free connection
+        with QueueClientFactory(pool_size=max(config.producers + config.consumers, 10)) as factory:
+            queue_service = factory.get_service_client(connection_string)
+            queue_service.create_queue(queue_name)
+            try:
+                if config.engine == 'async':
+                    from azure.storage.queue.aio import QueueClient as AsyncQueueClient
+
+                    async def run_async():
+                        async with AsyncQueueClient.from_connection_string(connection_string, queue_name) as queue_client:
+                            return await benchmark.run_async(queue_client)
+
+                    report = asyncio.run(run_async())
+                else:
+                    report = benchmark.run(factory.get_queue_client(connection_string, queue_name))
+            finally:
+                queue_service.delete_queue(queue_name)
+
+    report['target'] = 'local' if args.local else 'storage account'
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print('Benchmark report written to', args.output)
+    else:
+        print(text)
+    return report
@@ -0,0 +1,179 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.storage.queue import QueueServiceClient
+from azure.core.pipeline.transport import RequestsTransport
+import collections
+import requests
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Shared factory and cache for queue clients. QueueServiceClient.from_connection_string parses the
+# connection string and builds a new HTTP pipeline and connection pool on every call, so code that
+# creates a client per sample class or per queue pays for parsing and new TLS connections again and
+# again. QueueClientFactory keeps one client per connection string and queue name, builds every
+# client on one HTTP session whose connection pool size and keep-alive are configurable, and evicts
+# the least recently used clients once max_clients is reached or when they have been idle too long.
+# </summary>
+# -------------------------------------------------------------
+
+# Creates a requests session whose connection pool keeps up to pool_size connections per host.
+# The default requests pool keeps only 10 connections per host and discards the rest, which
+# forces new TLS handshakes once more than 10 requests are in flight.
+# Input Arguments:
+# pool_size - connections kept open per host
+# pool_hosts - number of hosts (storage accounts and endpoints) a connection pool is kept for
+# keep_alive - when False every request closes its connection
+def create_pooled_session(pool_size, pool_hosts=10, keep_alive=True):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+# Counters of a QueueClientFactory.
+class ClientCacheStats():
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+class QueueClientFactory():
+
+    # Input Arguments:
+    # pool_size - HTTP connections kept open per host, shared by every client of the factory
+    # pool_hosts - number of hosts a connection pool is kept for
+    # keep_alive - when False connections are closed after every request
+    # max_clients - number of cached clients above which the least recently used one is evicted
+    # idle_timeout - seconds after which an unused client is evicted, None to keep clients until evicted by size
+    # client_kwargs - passed to QueueServiceClient.from_connection_string, e.g. retry settings
+    def __init__(self, pool_size=32, pool_hosts=10, keep_alive=True, max_clients=1024, idle_timeout=300,
+                 **client_kwargs):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.client_kwargs = client_kwargs
+        self.session = create_pooled_session(pool_size, pool_hosts, keep_alive)
+        # the factory owns the session, so closing a client never closes the shared connections
+        self.transport = RequestsTransport(session=self.session, session_owner=False)
+        self.stats = ClientCacheStats()
+        self._clients = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # Returns the cached client for key, creating it with create when missing.
+    def _get(self, key, create):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients.move_to_end(key)
+                entry[1] = now
+                self.stats.hits += 1
+                return entry[0]
+            self.stats.misses += 1
+
+        client = create()
+        with self._lock:
+            # another thread may have created the same client in the meantime
+            entry = self._clients.setdefault(key, [client, now])
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self.stats.evictions += 1
+            return entry[0]
+
+    # Must be called with the lock held
+    def _evict_idle(self, now):
+        if self.idle_timeout is None:
+            return
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                return
+            del self._clients[key]
+            self.stats.evictions += 1
+
+    # Returns the QueueServiceClient for a connection string.
+    def get_service_client(self, connection_string):
+        return self._get((connection_string, None), lambda: QueueServiceClient.from_connection_string(
+            conn_str=connection_string, transport=self.transport, **self.client_kwargs))
+
+    # Returns the QueueClient for a queue. It shares the pipeline and credential of the service client.
+    def get_queue_client(self, connection_string, queue_name):
+        return self._get((connection_string, queue_name),
+                         lambda: self.get_service_client(connection_string).get_queue_client(queue_name))
+
+    # Number of cached clients.
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    # Drops every cached client and closes the shared connections.
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Compares creating a client per queue with QueueClientFactory when fanning out over many queues.
+# No request is sent, so this measures client creation (connection string parsing and pipeline
+# construction) and the number of connection pools the clients end up with.
+def run_benchmark(queue_count=500, repeat=3):
+    connection_string = ('DefaultEndpointsProtocol=https;AccountName=contoso;'
+                         'AccountKey=YWNjb3VudGtleQ==;EndpointSuffix=core.windows.net')
+    from azure.storage.queue import QueueClient
+
+    # each RequestsTransport holds its own session and connection pool; clients made from a service
+    # client reach it through a TransportWrapper
+    def connection_pool(client):
+        transport = client._pipeline._transport
+        while not isinstance(transport, RequestsTransport):
+            transport = transport._transport
+        return transport
+
+    start = time.perf_counter()
+    transports = []
+    for i in range(repeat):
+        for n in range(queue_count):
+            client = QueueClient.from_connection_string(connection_string, 'queue' + str(n))
+            transports.append(connection_pool(client))
+    per_queue = (time.perf_counter() - start) / (queue_count * repeat)
+    print('from_connection_string per queue: {0:8.1f} us per client, {1} connection pools'.format(
+        per_queue * 1e6, len(set(map(id, transports)))))
+
+    start = time.perf_counter()
+    transports = []
+    with QueueClientFactory() as factory:
+        for i in range(repeat):
+            for n in range(queue_count):
+                client = factory.get_queue_client(connection_string, 'queue' + str(n))
+                transports.append(connection_pool(client))
+        cached = (time.perf_counter() - start) / (queue_count * repeat)
+        print('QueueClientFactory:               {0:8.1f} us per client, {1} connection pools, {2} hits / {3} misses'.format(
+            cached * 1e6, len(set(map(id, transports))), factory.stats.hits, factory.stats.misses))
+
+if __name__ == '__main__':
+    run_benchmark()
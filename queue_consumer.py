@@ -0,0 +1,266 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import queue
+import threading
+import time
+
+# Largest number of messages the service returns from a single receive call.
+MAX_MESSAGES_PER_RECEIVE = 32
+
+# Visibility timeout, in seconds, the service applies when a receive call does not give one.
+DEFAULT_VISIBILITY_TIMEOUT = 30
+
+# Receives a single batch of up to batch_size messages. receive_messages keeps requesting pages
+# until the queue is empty, so only the first page is taken here.
+def receive_batch(queue_client, batch_size=MAX_MESSAGES_PER_RECEIVE, visibility_timeout=None):
+    pages = queue_client.receive_messages(messages_per_page=batch_size, visibility_timeout=visibility_timeout).by_page()
+    return list(next(pages, []))
+
+# Counters collected while a QueueConsumer runs.
+class ConsumerStats():
+
+    def __init__(self):
+        self.receive_calls = 0
+        self.received = 0
+        self.processed = 0
+        self.handler_errors = 0
+        self.deleted = 0
+        self.delete_errors = 0
+        self.receive_errors = 0
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+# -------------------------------------------------------------
+# <summary>
+# High throughput consumer for Azure Queue storage. A receiver thread fetches batches of up to 32
+# messages and keeps the next batch prefetched while the current one is handled by a pool of
+# worker threads. Each message is handed to the next free worker, so a slow handler holds up only
+# its own worker, not the rest of its batch. Messages whose handler succeeds are deleted by a
+# separate pool of threads; in background ack mode the consumer never waits for those deletes
+# before handing out the next batch.
+#
+# With a MessageLeaseManager the visibility of each message is renewed from the moment it is
+# received, while it waits in the prefetch buffer and while its handler runs, until it is deleted,
+# so a short visibility_timeout can be used even for handlers that take minutes.
+#
+# A message whose handler raises is not deleted and becomes visible again once its visibility
+# timeout expires, so handlers must tolerate redelivery.
+# </summary>
+# -------------------------------------------------------------
+class QueueConsumer():
+
+    # Input Arguments:
+    # queue_client - QueueClient to consume from
+    # handler - callable invoked with each QueueMessage; the message is deleted if it returns without raising
+    # batch_size - messages requested per receive call, at most 32 (the default)
+    # workers - number of threads running the handler
+    # delete_concurrency - number of threads issuing delete_message calls
+    # prefetch - number of received batches buffered ahead of the workers
+    # visibility_timeout - seconds received messages stay invisible to other consumers
+    # background_ack - when True deletes run behind the handlers, when False the deletes already submitted
+    #                  complete before the next batch is handed out
+    # poll_interval - seconds to wait after an empty receive when the consumer keeps running
+    # lease_manager - optional MessageLeaseManager renewing the visibility of received messages until they are deleted
+    # poller - optional AdaptivePoller over queue_client that replaces batch_size and poll_interval with adaptive ones;
+    #          receives and leases then use the poller's visibility_timeout
+    def __init__(self, queue_client, handler, batch_size=None, workers=8, delete_concurrency=16,
+                 prefetch=1, visibility_timeout=None, background_ack=True, poll_interval=1.0, lease_manager=None,
+                 poller=None):
+        if poller is not None:
+            if batch_size is not None:
+                raise ValueError('batch_size cannot be combined with a poller, which adapts the batch size itself')
+            if visibility_timeout is not None and visibility_timeout != poller.visibility_timeout:
+                raise ValueError('visibility_timeout {0} differs from the poller visibility_timeout {1}'.format(
+                    visibility_timeout, poller.visibility_timeout))
+            visibility_timeout = poller.visibility_timeout
+        batch_size = batch_size or MAX_MESSAGES_PER_RECEIVE
+        if not 1 <= batch_size <= MAX_MESSAGES_PER_RECEIVE:
+            raise ValueError('batch_size must be between 1 and {0}'.format(MAX_MESSAGES_PER_RECEIVE))
+        self.queue_client = queue_client
+        self.handler = handler
+        self.batch_size = batch_size
+        self.workers = workers
+        self.delete_concurrency = delete_concurrency
+        self.prefetch = prefetch
+        self.visibility_timeout = visibility_timeout
+        self.background_ack = background_ack
+        self.poll_interval = poll_interval
+        self.lease_manager = lease_manager
+        self.poller = poller
+        self.stats = ConsumerStats()
+        self._stopping = threading.Event()
+
+    # Asks a running consumer to stop after the batch it is currently handling.
+    def stop(self):
+        self._stopping.set()
+        if self.poller is not None:
+            self.poller.wake()
+
+    # Consumes messages until stop() is called, or until the queue is found empty when stop_when_empty is set.
+    # Returns the ConsumerStats of the run.
+    def run(self, stop_when_empty=True):
+        self._stopping.clear()
+        batches = queue.Queue(maxsize=self.prefetch)
+        receiver = threading.Thread(target=self._receive_loop, args=(batches, stop_when_empty), daemon=True)
+        receiver.start()
+
+        # a slot is taken for every message submitted to the handlers and given back when its handler
+        # returns, so messages are dispatched as soon as a worker is free rather than batch by batch
+        slots = threading.Semaphore(self.workers)
+        pending_deletes = set()
+        pending_lock = threading.Lock()
+
+        def delete_done(delete):
+            with pending_lock:
+                pending_deletes.discard(delete)
+
+        # the handler pool is shut down first, so done callbacks can still submit deletes
+        with ThreadPoolExecutor(max_workers=self.delete_concurrency) as deleters, \
+                ThreadPoolExecutor(max_workers=self.workers) as handlers:
+
+            def handled(future):
+                slots.release()
+                if future.result() is None:
+                    return
+                delete = deleters.submit(self._delete, *future.result())
+                if not self.background_ack:
+                    with pending_lock:
+                        pending_deletes.add(delete)
+                    delete.add_done_callback(delete_done)
+
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if not self.background_ack:
+                    with pending_lock:
+                        deletes = list(pending_deletes)
+                    wait(deletes)
+                for message, lease in batch:
+                    slots.acquire()
+                    handlers.submit(self._handle, message, lease).add_done_callback(handled)
+
+        receiver.join()
+        return self.stats
+
+    def _receive_loop(self, batches, stop_when_empty):
+        try:
+            while not self._stopping.is_set():
+                received_at = time.monotonic()
+                try:
+                    if self.poller is not None:
+                        batch = self.poller.poll()
+                    else:
+                        batch = receive_batch(self.queue_client, self.batch_size, self.visibility_timeout)
+                except Exception:
+                    self.stats.increment('receive_errors')
+                    self._wait()
+                    continue
+                self.stats.increment('receive_calls')
+                if not batch:
+                    if stop_when_empty:
+                        break
+                    self._wait()
+                    continue
+                self.stats.increment('received', len(batch))
+                # Leases start here rather than in the handler, so messages waiting in the prefetch
+                # buffer or for a free worker are renewed too
+                batch = [(message, self._track(message, received_at)) for message in batch]
+                # Blocks while the prefetch buffer is full, but keeps checking for stop()
+                while not self._stopping.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                else:
+                    # stopped before the batch was handed over: its messages become visible again
+                    # when their current timeout expires
+                    for message, lease in batch:
+                        if lease is not None:
+                            lease.release()
+        finally:
+            batches.put(None)
+
+    # Waits before the next receive after an empty or failed one, returning early on stop().
+    def _wait(self):
+        if self.poller is not None:
+            self.poller.sleep()
+        else:
+            self._stopping.wait(self.poll_interval)
+
+    def _track(self, message, received_at):
+        if self.lease_manager is None:
+            return None
+        return self.lease_manager.track(message, self.visibility_timeout or DEFAULT_VISIBILITY_TIMEOUT, received_at)
+
+    def _handle(self, message, lease):
+        try:
+            self.handler(message)
+        except Exception:
+            self.stats.increment('handler_errors')
+            if lease is not None:
+                lease.release()
+            return None
+        self.stats.increment('processed')
+        return message, lease
+
+    # Deletes a handled message. A leased message stays renewed until it is deleted, and is
+    # deleted with the pop receipt of its latest renewal.
+    def _delete(self, message, lease):
+        try:
+            if lease is not None:
+                lease.complete()
+            else:
+                self.queue_client.delete_message(message=message.id, pop_receipt=message.pop_receipt)
+            self.stats.increment('deleted')
+        except Exception:
+            self.stats.increment('delete_errors')
+
+# Compares the drain rate of the receive-one/delete-one sample loop with QueueConsumer
+# against the local stand-in for the queue service.
+def run_benchmark(message_count=1000, latency=0.005):
+    from local_queue_service import LocalQueueServiceClient
+    from queue_producer import send_messages
+
+    queue_service = LocalQueueServiceClient(latency=0)
+    queue_client = queue_service.create_queue('benchmarkqueue')
+
+    send_messages(queue_client, ('benchmark message' + str(i) for i in range(message_count)))
+    queue_service.latency = latency
+    start = time.perf_counter()
+    for message in queue_client.receive_messages():
+        queue_client.delete_message(message=message.id, pop_receipt=message.pop_receipt)
+    sample_loop = time.perf_counter() - start
+    print('Sample receive/delete loop: {0:8.0f} msgs/s'.format(message_count / sample_loop))
+
+    queue_service.latency = 0
+    send_messages(queue_client, ('benchmark message' + str(i) for i in range(message_count)))
+    queue_service.latency = latency
+    consumer = QueueConsumer(queue_client, lambda message: None)
+    start = time.perf_counter()
+    stats = consumer.run()
+    elapsed = time.perf_counter() - start
+    print('QueueConsumer:              {0:8.0f} msgs/s, {1} deleted in {2} receive calls'.format(
+        stats.deleted / elapsed, stats.deleted, stats.receive_calls))
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,412 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.core.paging import ItemPaged
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Instrumentation for QueueServiceClient and QueueClient calls. InstrumentedQueueServiceClient and
+# InstrumentedQueueClient wrap the SDK clients and record, per operation, the number of calls and
+# errors, message bytes sent and received, retries made by the SDK retry policy, and the latency of
+# every call in a LatencyHistogram. A tracer callable can also be given to receive a CallTrace
+# after every call. QueueMetrics.snapshot returns the numbers as a dictionary and to_prometheus
+# renders them in the Prometheus text exposition format.
+#
+# Paged operations (list_queues, receive_messages) issue their requests while being iterated, so
+# each page request is recorded as one call.
+# </summary>
+# -------------------------------------------------------------
+
+# Operations timed on each client. Other attributes are passed through untouched.
+SERVICE_OPERATIONS = frozenset(['create_queue', 'delete_queue', 'list_queues', 'get_service_properties',
+                                'set_service_properties', 'get_service_stats'])
+QUEUE_OPERATIONS = frozenset(['create_queue', 'delete_queue', 'get_queue_properties', 'set_queue_metadata',
+                              'get_queue_access_policy', 'set_queue_access_policy', 'send_message',
+                              'receive_messages', 'peek_messages', 'update_message', 'delete_message',
+                              'clear_messages'])
+
+# Histogram bucket boundaries, in seconds, used for the Prometheus export.
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Latency histogram with HDR style log-linear buckets. Values are recorded in microseconds into
+# 2 ** precision_bits linear sub-buckets per power of two, so recording is a few integer
+# operations and percentiles are accurate to within 1 / 2 ** precision_bits of the value.
+class LatencyHistogram():
+
+    def __init__(self, precision_bits=5):
+        self.precision_bits = precision_bits
+        self._sub_buckets = 1 << precision_bits
+        self.counts = []
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, micros):
+        if micros < self._sub_buckets:
+            return micros
+        shift = micros.bit_length() - self.precision_bits - 1
+        return self._sub_buckets * (shift + 1) + (micros >> shift) - self._sub_buckets
+
+    # Highest value, in microseconds, recorded into the bucket at index.
+    def _upper_bound(self, index):
+        if index < self._sub_buckets:
+            return index
+        shift = index // self._sub_buckets - 1
+        mantissa = index % self._sub_buckets + self._sub_buckets
+        return ((mantissa + 1) << shift) - 1
+
+    # Records a latency given in seconds.
+    def record(self, seconds):
+        index = self._index(max(0, int(seconds * 1000000)))
+        with self._lock:
+            if index >= len(self.counts):
+                self.counts.extend([0] * (index + 1 - len(self.counts)))
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    # Returns the latency, in seconds, below which p percent of the recorded values fall.
+    def percentile(self, p):
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, int(p / 100.0 * self.count + 0.5))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return min(self._upper_bound(index) / 1000000.0, self.max)
+        return self.max
+
+    # Returns the number of recorded values at or below each of the boundaries, in seconds. The values
+    # of a bucket that spans a boundary are taken as spread evenly over the bucket, and the share at or
+    # below the boundary is counted, so the counts are estimates within one bucket's width.
+    def cumulative_counts(self, boundaries):
+        with self._lock:
+            counts = list(self.counts)
+        result = []
+        seen = 0
+        index = 0
+        for boundary in boundaries:
+            limit = int(boundary * 1000000)
+            while index < len(counts) and self._upper_bound(index) <= limit:
+                seen += counts[index]
+                index += 1
+            spanning = 0.0
+            if index < len(counts) and counts[index]:
+                lower = self._upper_bound(index - 1) + 1 if index else 0
+                if lower <= limit:
+                    spanning = counts[index] * (limit - lower + 1) / float(self._upper_bound(index) - lower + 1)
+            result.append(int(round(seen + spanning)))
+        return result
+
+    # Adds the values recorded in other to this histogram.
+    def merge(self, other):
+        with other._lock:
+            counts, count, total, low, high = list(other.counts), other.count, other.total, other.min, other.max
+        with self._lock:
+            if len(counts) > len(self.counts):
+                self.counts.extend([0] * (len(counts) - len(self.counts)))
+            for index, value in enumerate(counts):
+                self.counts[index] += value
+            self.count += count
+            self.total += total
+            if low is not None and (self.min is None or low < self.min):
+                self.min = low
+            if high is not None and (self.max is None or high > self.max):
+                self.max = high
+
+    def summary(self):
+        result = {'count': self.count}
+        if self.count:
+            result.update({
+                'mean_ms': self.total / self.count * 1000,
+                'min_ms': self.min * 1000,
+                'p50_ms': self.percentile(50) * 1000,
+                'p95_ms': self.percentile(95) * 1000,
+                'p99_ms': self.percentile(99) * 1000,
+                'max_ms': self.max * 1000,
+            })
+        return result
+
+# Counters and latency histogram of one operation.
+class OperationMetrics():
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def record(self, seconds, error, bytes_sent, bytes_received, retries):
+        self.latency.record(seconds)
+        with self._lock:
+            self.calls += 1
+            self.errors += error is not None
+            self.retries += retries
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+# Details of one instrumented call, passed to the tracer.
+class CallTrace():
+
+    def __init__(self, operation, queue_name, started, duration, error, bytes_sent, bytes_received, retries):
+        self.operation = operation
+        self.queue_name = queue_name
+        self.started = started
+        self.duration = duration
+        self.error = error
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.retries = retries
+
+# Metrics of all operations, shared by every client created from the same instrumented service client.
+class QueueMetrics():
+
+    def __init__(self, tracer=None):
+        self.tracer = tracer
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def operation(self, name):
+        metrics = self._operations.get(name)
+        if metrics is None:
+            with self._lock:
+                metrics = self._operations.setdefault(name, OperationMetrics())
+        return metrics
+
+    def record(self, operation, queue_name, started, seconds, error=None, bytes_sent=0, bytes_received=0, retries=0):
+        self.operation(operation).record(seconds, error, bytes_sent, bytes_received, retries)
+        if self.tracer is not None:
+            self.tracer(CallTrace(operation, queue_name, started, seconds, error, bytes_sent, bytes_received, retries))
+
+    # Returns the counters and latency summary of every operation.
+    def snapshot(self):
+        with self._lock:
+            operations = dict(self._operations)
+        result = {}
+        for name, metrics in sorted(operations.items()):
+            entry = {'calls': metrics.calls, 'errors': metrics.errors, 'retries': metrics.retries,
+                     'bytes_sent': metrics.bytes_sent, 'bytes_received': metrics.bytes_received}
+            entry['latency'] = metrics.latency.summary()
+            result[name] = entry
+        return result
+
+    # Returns the metrics in the Prometheus text exposition format.
+    def to_prometheus(self, prefix='azure_queue'):
+        with self._lock:
+            operations = sorted(self._operations.items())
+        lines = []
+        counters = (('calls', 'Number of calls'), ('errors', 'Number of calls that raised'),
+                    ('retries', 'Number of retries made by the SDK retry policy'),
+                    ('bytes_sent', 'Message bytes sent'), ('bytes_received', 'Message bytes received'))
+        for field, description in counters:
+            name = '{0}_{1}_total'.format(prefix, field)
+            lines.append('# HELP {0} {1}.'.format(name, description))
+            lines.append('# TYPE {0} counter'.format(name))
+            for operation, metrics in operations:
+                lines.append('{0}{{operation="{1}"}} {2}'.format(name, operation, getattr(metrics, field)))
+
+        name = prefix + '_operation_duration_seconds'
+        lines.append('# HELP {0} Latency of queue operations.'.format(name))
+        lines.append('# TYPE {0} histogram'.format(name))
+        for operation, metrics in operations:
+            histogram = metrics.latency
+            for boundary, count in zip(PROMETHEUS_BUCKETS, histogram.cumulative_counts(PROMETHEUS_BUCKETS)):
+                lines.append('{0}_bucket{{operation="{1}",le="{2}"}} {3}'.format(name, operation, boundary, count))
+            lines.append('{0}_bucket{{operation="{1}",le="+Inf"}} {2}'.format(name, operation, histogram.count))
+            lines.append('{0}_sum{{operation="{1}"}} {2}'.format(name, operation, histogram.total))
+            lines.append('{0}_count{{operation="{1}"}} {2}'.format(name, operation, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+def _content_size(content):
+    if isinstance(content, (str, bytes, bytearray)):
+        return len(content)
+    return 0
+
+# Position of the content argument of the operations that send message content.
+_CONTENT_POSITIONS = {'send_message': 0, 'update_message': 2}
+
+def _sent_content(operation, args, kwargs):
+    if 'content' in kwargs:
+        return kwargs['content']
+    position = _CONTENT_POSITIONS.get(operation)
+    if position is not None and len(args) > position:
+        return args[position]
+    return None
+
+# Shared wrapping logic of the instrumented clients.
+class _InstrumentedClient():
+
+    def __init__(self, client, metrics, operations, queue_name=None):
+        self._client = client
+        self._metrics = metrics
+        self._operations = operations
+        self._queue_name = queue_name
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in self._operations:
+            return attribute
+        if name in ('receive_messages', 'list_queues'):
+            return lambda *args, **kwargs: self._paged(name, attribute, *args, **kwargs)
+        return lambda *args, **kwargs: self._call(name, attribute, *args, **kwargs)
+
+    def __enter__(self):
+        self._client.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._client.__exit__(*exc_info)
+
+    # Adds a retry_hook that counts the retries of the SDK retry policy, chaining any hook given by the caller.
+    def _with_retry_counter(self, kwargs):
+        retries = [0]
+        user_hook = kwargs.pop('retry_hook', None)
+
+        def retry_hook(**hook_kwargs):
+            retries[0] += 1
+            if user_hook is not None:
+                user_hook(**hook_kwargs)
+
+        kwargs['retry_hook'] = retry_hook
+        return retries
+
+    def _call(self, operation, function, *args, **kwargs):
+        retries = self._with_retry_counter(kwargs)
+        bytes_sent = _content_size(_sent_content(operation, args, kwargs))
+        started = time.time()
+        start = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return self._wrap_result(operation, result)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            bytes_received = 0
+            if operation == 'peek_messages' and result:
+                bytes_received = sum(_content_size(message.content) for message in result)
+            self._metrics.record(operation, self._queue_name, started, time.perf_counter() - start, error,
+                                 bytes_sent, bytes_received, retries[0])
+
+    def _paged(self, operation, function, *args, **kwargs):
+        retries = self._with_retry_counter(kwargs)
+        pages = function(*args, **kwargs).by_page()
+
+        def get_next(continuation_token):
+            retries_before = retries[0]
+            started = time.time()
+            start = time.perf_counter()
+            error = None
+            page = []
+            try:
+                page = list(next(pages, []))
+                return page
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                bytes_received = sum(_content_size(getattr(item, 'content', None)) for item in page)
+                self._metrics.record(operation, self._queue_name, started, time.perf_counter() - start, error,
+                                     0, bytes_received, retries[0] - retries_before)
+
+        def extract_data(items):
+            if operation == 'list_queues':
+                return pages.continuation_token, iter(items)
+            # receive_messages has no continuation token and pages until a receive comes back empty
+            if not items:
+                raise StopIteration('End of paging')
+            return 'TOKEN_IGNORED', iter(items)
+
+        return ItemPaged(get_next, extract_data)
+
+    def _wrap_result(self, operation, result):
+        return result
+
+# QueueServiceClient wrapper recording metrics of service level calls and of the queue clients it creates.
+class InstrumentedQueueServiceClient(_InstrumentedClient):
+
+    # Input Arguments:
+    # queue_service - QueueServiceClient to instrument
+    # metrics - QueueMetrics to record into, a new one when not given
+    # tracer - optional callable receiving a CallTrace after every call, used when metrics is not given
+    def __init__(self, queue_service, metrics=None, tracer=None):
+        super(InstrumentedQueueServiceClient, self).__init__(queue_service, metrics or QueueMetrics(tracer), SERVICE_OPERATIONS)
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def get_queue_client(self, queue, **kwargs):
+        return InstrumentedQueueClient(self._client.get_queue_client(queue, **kwargs), self._metrics)
+
+    def _wrap_result(self, operation, result):
+        if operation == 'create_queue':
+            return InstrumentedQueueClient(result, self._metrics)
+        return result
+
+# QueueClient wrapper recording metrics of queue and message calls.
+class InstrumentedQueueClient(_InstrumentedClient):
+
+    def __init__(self, queue_client, metrics=None, tracer=None):
+        super(InstrumentedQueueClient, self).__init__(queue_client, metrics or QueueMetrics(tracer), QUEUE_OPERATIONS,
+                                                      getattr(queue_client, 'queue_name', None))
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+# Measures the cost of the instrumentation itself against the local stand-in without latency.
+def run_benchmark(iterations=20000):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_service = LocalQueueServiceClient()
+    plain = queue_service.create_queue('benchmarkqueue')
+    instrumented = InstrumentedQueueClient(plain)
+
+    histogram = LatencyHistogram()
+    start = time.perf_counter()
+    for i in range(iterations):
+        histogram.record(0.0042)
+    print('LatencyHistogram.record:       {0:8.0f} ns'.format((time.perf_counter() - start) / iterations * 1e9))
+
+    for name, client in (('plain', plain), ('instrumented', instrumented)):
+        client.clear_messages()
+        start = time.perf_counter()
+        for i in range(iterations):
+            client.send_message('benchmark message')
+        elapsed = time.perf_counter() - start
+        print('send_message ({0:<12}):   {1:8.0f} ns'.format(name, elapsed / iterations * 1e9))
+
+    print()
+    print(instrumented.metrics.to_prometheus(), end='')
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,258 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from azure.core.exceptions import ResourceNotFoundError
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Cached queue metrics for many queues. Reading the length of hundreds of queues with one
+# get_queue_properties call each, every time an autoscaler looks, costs a transaction per queue
+# per look and takes as long as the calls take. QueueMetricsCache lists the queues and their
+# metadata with include_metadata in one paged pass, reads the approximate message counts
+# concurrently (list_queues does not return them), and keeps the result as an immutable
+# MetricsSnapshot, so every caller sees the depths of all queues as of the same refresh.
+#
+# A snapshot younger than ttl is returned as is. An older one is still returned straight away
+# (stale-while-revalidate) while a single background refresh replaces it; only a snapshot older
+# than ttl + max_stale, or no snapshot at all, makes the caller wait for a refresh. Concurrent
+# refreshes are coalesced into one.
+# </summary>
+# -------------------------------------------------------------
+
+# Metrics of one queue.
+class QueueInfo():
+
+    def __init__(self, name, approximate_message_count, metadata, error=None):
+        self.name = name
+        self.approximate_message_count = approximate_message_count
+        self.metadata = metadata
+        # error of the last properties read when approximate_message_count is from an earlier refresh
+        self.error = error
+
+# Metrics of all queues as of one refresh.
+class MetricsSnapshot():
+
+    def __init__(self, queues, taken_at, duration):
+        self.queues = queues
+        self.taken_at = taken_at
+        self.duration = duration
+
+    @property
+    def age(self):
+        return time.monotonic() - self.taken_at
+
+    # Returns a dict of approximate message count by queue name.
+    def depths(self):
+        return {name: info.approximate_message_count for name, info in self.queues.items()}
+
+    @property
+    def total_messages(self):
+        return sum(info.approximate_message_count or 0 for info in self.queues.values())
+
+    def __getitem__(self, name):
+        return self.queues[name]
+
+    def __contains__(self, name):
+        return name in self.queues
+
+    def __iter__(self):
+        return iter(self.queues.values())
+
+    def __len__(self):
+        return len(self.queues)
+
+# Counters of a QueueMetricsCache. The list_queues_pages and get_queue_properties counters
+# are the calls made to the queue service.
+class MetricsCacheStats():
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.list_queues_pages = 0
+        self.get_queue_properties = 0
+        self.get_queue_properties_errors = 0
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def backend_calls(self):
+        return self.list_queues_pages + self.get_queue_properties
+
+class QueueMetricsCache():
+
+    # Input Arguments:
+    # queue_service - QueueServiceClient of the queues
+    # name_starts_with - only queues whose name starts with this prefix, all queues when None
+    # ttl - seconds a snapshot is served without refreshing it
+    # max_stale - seconds past ttl a snapshot is still served while it is refreshed in the background
+    # concurrency - maximum number of get_queue_properties calls in flight during a refresh
+    # results_per_page - queues per list_queues page, the service default (5000) when None
+    def __init__(self, queue_service, name_starts_with=None, ttl=10.0, max_stale=60.0, concurrency=16,
+                 results_per_page=None):
+        self.queue_service = queue_service
+        self.name_starts_with = name_starts_with
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.results_per_page = results_per_page
+        self.stats = MetricsCacheStats()
+        self._snapshot = None
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._revalidating = False
+
+    # Returns the current MetricsSnapshot, refreshing it as described in the module summary.
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.age >= self.ttl + self.max_stale:
+            self.stats.increment('misses')
+            return self._refresh(snapshot)
+        if snapshot.age < self.ttl:
+            self.stats.increment('hits')
+            return snapshot
+        self.stats.increment('stale_hits')
+        with self._lock:
+            start = not self._revalidating
+            self._revalidating = True
+        if start:
+            threading.Thread(target=self._revalidate, daemon=True).start()
+        return snapshot
+
+    # Returns the approximate message count of a queue from the current snapshot.
+    def depth(self, queue_name):
+        return self.snapshot()[queue_name].approximate_message_count
+
+    # Returns the approximate message count by queue name from the current snapshot.
+    def depths(self):
+        return self.snapshot().depths()
+
+    def _revalidate(self):
+        try:
+            self._refresh(self._snapshot)
+        except Exception:
+            # the stale snapshot keeps being served, the next stale read tries again
+            pass
+        finally:
+            with self._lock:
+                self._revalidating = False
+
+    # Lists the queues and reads their properties, replacing the cached snapshot.
+    def refresh(self):
+        with self._refresh_lock:
+            return self._load_snapshot()
+
+    # Refreshes the snapshot replacing unless another refresh replaced it while this caller waited.
+    def _refresh(self, replacing):
+        with self._refresh_lock:
+            if self._snapshot is not replacing:
+                return self._snapshot
+            return self._load_snapshot()
+
+    # Must be called with the refresh lock held
+    def _load_snapshot(self):
+        try:
+            self._snapshot = self._load(self._snapshot)
+        except Exception:
+            self.stats.increment('refresh_errors')
+            raise
+        self.stats.increment('refreshes')
+        return self._snapshot
+
+    def _load(self, previous):
+        start = time.monotonic()
+        listed = []
+        pages = self.queue_service.list_queues(name_starts_with=self.name_starts_with, include_metadata=True,
+                                               results_per_page=self.results_per_page).by_page()
+        for page in pages:
+            self.stats.increment('list_queues_pages')
+            listed.extend(page)
+
+        queues = {}
+        for queue, info in zip(listed, self._executor.map(lambda queue: self._read_properties(queue, previous), listed)):
+            if info is not None:
+                queues[queue.name] = info
+        return MetricsSnapshot(queues, time.monotonic(), time.monotonic() - start)
+
+    # Returns the QueueInfo of a listed queue, None when it was deleted after being listed.
+    def _read_properties(self, queue, previous):
+        self.stats.increment('get_queue_properties')
+        try:
+            properties = self.queue_service.get_queue_client(queue.name).get_queue_properties()
+            return QueueInfo(queue.name, properties.approximate_message_count, queue.metadata)
+        except ResourceNotFoundError:
+            return None
+        except Exception as e:
+            self.stats.increment('get_queue_properties_errors')
+            count = previous[queue.name].approximate_message_count if previous is not None and queue.name in previous else None
+            return QueueInfo(queue.name, count, queue.metadata, error=e)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Simulates an autoscaler reading the depth of every queue ten times per second, once with a
+# get_queue_properties call per queue and once through QueueMetricsCache, on the local stand-in.
+def run_benchmark(queue_count=200, duration=3.0, reads_per_second=10, latency=0.005):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_service = LocalQueueServiceClient(latency=0)
+    for i in range(queue_count):
+        queue_client = queue_service.create_queue('benchmarkqueue' + str(i))
+        for n in range(i % 7):
+            queue_client.send_message('message' + str(n))
+    queue_service.latency = latency
+
+    def autoscale(read_depths):
+        queue_service.call_counts.clear()
+        read_times = []
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            read_start = time.monotonic()
+            depths = read_depths()
+            read_times.append(time.monotonic() - read_start)
+            time.sleep(max(0.0, 1.0 / reads_per_second - read_times[-1]))
+        reads = len(read_times)
+        return reads, sum(read_times) / reads, sum(queue_service.call_counts.values()) / reads
+
+    def per_queue_depths():
+        return {queue.name: queue_service.get_queue_client(queue.name).get_queue_properties().approximate_message_count
+                for queue in queue_service.list_queues('benchmarkqueue')}
+
+    reads, mean_read, calls = autoscale(per_queue_depths)
+    print('get_queue_properties per queue: {0:3} reads, {1:8.2f} ms per read, {2:6.1f} service calls per read'.format(
+        reads, mean_read * 1000, calls))
+
+    with QueueMetricsCache(queue_service, 'benchmarkqueue', ttl=1.0) as cache:
+        reads, mean_read, calls = autoscale(cache.depths)
+        print('QueueMetricsCache (ttl 1s):     {0:3} reads, {1:8.2f} ms per read, {2:6.1f} service calls per read, {3} refreshes'.format(
+            reads, mean_read * 1000, calls, cache.stats.refreshes))
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,113 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# -------------------------------------------------------------
+# <summary>
+# Bulk producer for Azure Queue storage. Sending one message at a time pays a full HTTP round trip
+# per message. send_messages pipelines the sends over a bounded thread pool that shares the
+# transport (and so the HTTP connection pool) of a single QueueClient, and blocks the caller when
+# the number of in-flight requests reaches a limit so that large iterables are not buffered in memory.
+# Get the QueueClient from a QueueClientFactory whose pool_size covers the number of threads.
+# </summary>
+# -------------------------------------------------------------
+
+# Outcome of sending a single message. Either message (the QueueMessage returned by the service)
+# or error (the exception raised by the send) is set.
+class SendResult():
+
+    def __init__(self, index, content, message=None, error=None):
+        self.index = index
+        self.content = content
+        self.message = message
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+# Outcome of a bulk send, ordered by the position of each message in the input iterable.
+class BulkSendResult():
+
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def succeeded(self):
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.succeeded]
+
+def _send_one(queue_client, index, content, send_kwargs):
+    try:
+        message = queue_client.send_message(content, **send_kwargs)
+        return SendResult(index, content, message=message)
+    except Exception as e:
+        return SendResult(index, content, error=e)
+
+# Sends every message of an iterable to the queue using a pool of worker threads.
+# Input Arguments:
+# queue_client - QueueClient shared by all worker threads
+# messages - iterable of message contents; consumed lazily
+# concurrency - number of worker threads sending in parallel
+# max_in_flight - maximum number of submitted but unfinished sends, defaults to twice the concurrency.
+#   Iteration over messages pauses while this limit is reached.
+# send_kwargs - passed through to send_message (for example visibility_timeout or time_to_live)
+# Returns a BulkSendResult; failures are reported per message and never raised.
+def send_messages(queue_client, messages, concurrency=8, max_in_flight=None, **send_kwargs):
+    if concurrency < 1:
+        raise ValueError('concurrency must be at least 1')
+    max_in_flight = max_in_flight or concurrency * 2
+    if max_in_flight < concurrency:
+        raise ValueError('max_in_flight must not be lower than concurrency')
+
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, content in enumerate(messages):
+            in_flight.acquire()
+            future = executor.submit(_send_one, queue_client, index, content, send_kwargs)
+            future.add_done_callback(lambda f: in_flight.release())
+            futures.append(future)
+
+    return BulkSendResult([future.result() for future in futures])
+
+# Compares sequential sends with send_messages against the local stand-in for the queue service.
+def run_benchmark(message_count=500, latency=0.005, concurrency=32):
+    from local_queue_service import LocalQueueServiceClient
+
+    queue_service = LocalQueueServiceClient(latency=latency)
+    queue_client = queue_service.create_queue('benchmarkqueue')
+    messages = ['benchmark message' + str(i) for i in range(message_count)]
+
+    start = time.perf_counter()
+    for message in messages:
+        queue_client.send_message(message)
+    sequential = time.perf_counter() - start
+    print('Sequential send:       {0:8.0f} msgs/s'.format(message_count / sequential))
+
+    start = time.perf_counter()
+    result = send_messages(queue_client, messages, concurrency=concurrency)
+    concurrent = time.perf_counter() - start
+    print('send_messages (x{0:<3}): {1:8.0f} msgs/s, {2} failed'.format(concurrency, message_count / concurrent, len(result.failed)))
+
+if __name__ == '__main__':
+    run_benchmark()
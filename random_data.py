@@ -1,18 +1,121 @@
+import os
 import random, string
-from random import randint
+import time
+
+# Byte values below 26 * 9 = 234 map evenly onto the 26 lowercase letters, larger ones are dropped.
+_LETTERS_TABLE = bytes(string.ascii_lowercase.encode('ascii')[i % 26] for i in range(256))
+_UNEVEN_BYTES = bytes(range(26 * 9, 256))
 
 # Gets random data to use in samples
 class RandomData:
+    # Input Arguments:
+    # seed - when given, the same seed returns the same data for the same sequence of calls
+    def __init__(self, seed=None):
+        self.seed = seed
+        self._random = random.Random(seed)
+
     # Gets random characters to use for generating unique name.
     def get_random_name(self, length):
-        return ''.join(random.choice(string.ascii_lowercase) for i in range(length))
+        return self.get_random_text(length)
 
     # Gets Random Bytes of specified size for use in samples.
+    # Unseeded data comes from os.urandom, seeded data from the seeded generator; both are generated in bulk.
     # Input Arguments:
     # size - size of random bytes to get
     def get_random_bytes(self, size):
-        rand = random.Random()
+        if self.seed is None:
+            return os.urandom(size)
+        if hasattr(self._random, 'randbytes'):
+            return self._random.randbytes(size)
+        return self._random.getrandbits(8 * size).to_bytes(size, 'little') if size else b''
+
+    # Gets a random string of lowercase letters of specified size.
+    # Random bytes are mapped to letters with bytes.translate, so no Python code runs per character.
+    def get_random_text(self, size):
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.get_random_bytes(remaining + remaining // 8 + 16).translate(_LETTERS_TABLE, _UNEVEN_BYTES)
+            chunks.append(chunk[:remaining])
+            remaining -= len(chunks[-1])
+        return b''.join(chunks).decode('ascii')
+
+    # Gets a PayloadPool of random text, or bytes when text is False, with payload sizes drawn from sizes.
+    def get_payload_pool(self, sizes, pool_size=4 * 1024 * 1024, text=True):
+        data = self.get_random_text(pool_size).encode('ascii') if text else self.get_random_bytes(pool_size)
+        return PayloadPool(data, sizes, random.Random(self._random.getrandbits(64)), text)
+
+# Random payloads sliced out of one pre-generated buffer. A payload is a memoryview of the buffer
+# at a random offset, so generating one costs no copy and no random data; with a 4 MB pool every
+# payload size has millions of distinct offsets. Payloads of one pool overlap, so a load generator
+# that needs every message to differ prefixes them with a sequence number or timestamp.
+class PayloadPool:
+    # Input Arguments:
+    # data - the pre-generated buffer
+    # sizes - payload size, or a callable returning a size from a random.Random like queue_benchmark.parse_size_distribution
+    # rand - random.Random used for the sizes and offsets
+    # text - whether data is ASCII text that text() can return as str
+    def __init__(self, data, sizes, rand, text=True):
+        self.text_data = text
+        self._view = memoryview(data)
+        self._sizes = sizes if callable(sizes) else (lambda rand: sizes)
+        self._random = rand
+
+    def __len__(self):
+        return len(self._view)
+
+    # Returns a payload as a memoryview of the pool, of size bytes or a size drawn from the pool's sizes.
+    def payload(self, size=None):
+        if size is None:
+            size = self._sizes(self._random)
+        if not 0 <= size <= len(self._view):
+            raise ValueError('payload size {0} is larger than the pool of {1} bytes'.format(size, len(self._view)))
+        offset = self._random.randrange(len(self._view) - size + 1)
+        return self._view[offset:offset + size]
+
+    # Returns a payload as str, for queue messages whose content is text. This copies the payload once.
+    def text(self, size=None):
+        if not self.text_data:
+            raise ValueError('the pool holds bytes, not text')
+        return str(self.payload(size), 'ascii')
+
+    # Yields count payloads, or payloads forever when count is None.
+    def payloads(self, count=None):
+        i = 0
+        while count is None or i < count:
+            yield self.payload()
+            i += 1
+
+# Compares generating 64 KB payloads one random call per byte, in bulk, and by slicing a PayloadPool.
+def run_benchmark(size=64 * 1024, count=200):
+    rand = random.Random()
+    start = time.perf_counter()
+    for i in range(count // 10):
         result = bytearray(size)
-        for i in range(size):
-            result[i] = rand.randint(0, 255)
-        return bytes(result)
\ No newline at end of file
+        for n in range(size):
+            result[n] = rand.randint(0, 255)
+    per_byte = (time.perf_counter() - start) / (count // 10)
+    print('randint per byte:     {0:10.1f} MB/s'.format(size / per_byte / 1e6))
+
+    for name, random_data in (('os.urandom', RandomData()), ('seeded randbytes', RandomData(seed=1))):
+        start = time.perf_counter()
+        for i in range(count):
+            random_data.get_random_bytes(size)
+        print('{0:<21} {1:10.1f} MB/s'.format(name + ':', size * count / (time.perf_counter() - start) / 1e6))
+
+    random_data = RandomData(seed=1)
+    start = time.perf_counter()
+    for i in range(count):
+        random_data.get_random_text(size)
+    print('random text:          {0:10.1f} MB/s'.format(size * count / (time.perf_counter() - start) / 1e6))
+
+    pool = random_data.get_payload_pool(size)
+    start = time.perf_counter()
+    for payload in pool.payloads(count * 100):
+        pass
+    elapsed = time.perf_counter() - start
+    print('payload pool slices:  {0:10.1f} MB/s, {1:8.0f} payloads/s'.format(
+        size * count * 100 / elapsed / 1e6, count * 100 / elapsed))
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,181 @@
+#----------------------------------------------------------------------------------
+# Microsoft Developer & Platform Evangelism
+#
+# Copyright (c) Microsoft Corporation. All rights reserved.
+#
+# THIS CODE AND INFORMATION ARE PROVIDED "AS IS" WITHOUT WARRANTY OF ANY KIND,
+# EITHER EXPRESSED OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE IMPLIED WARRANTIES
+# OF MERCHANTABILITY AND/OR FITNESS FOR A PARTICULAR PURPOSE.
+#----------------------------------------------------------------------------------
+# The example companies, organizations, products, domain names,
+# e-mail addresses, logos, people, places, and events depicted
+# herein are fictitious.  No association with any real company,
+# organization, product, domain name, email address, logo, person,
+# places, or events is intended or should be inferred.
+#----------------------------------------------------------------------------------
+
+from queue_admin import create_queues_with_prefix, delete_queues_with_prefix
+from queue_consumer import receive_batch, MAX_MESSAGES_PER_RECEIVE
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import random
+import threading
+import time
+import zlib
+
+# -------------------------------------------------------------
+# <summary>
+# Sharded queue - a single queue is limited to about 2,000 messages per second, so ShardedQueue
+# spreads messages over shard_count queues named queue_prefix + '0', queue_prefix + '1', ...
+# Messages are sent round-robin, or to the shard picked by hashing a key so that all messages of
+# one key go to the same queue. Receivers pick a shard at random, weighted by its approximate
+# message count, so the deepest shards are drained first while empty shards are still polled now
+# and then. The counts are refreshed from get_queue_properties every refresh_interval seconds and
+# adjusted locally for every message sent and received in between.
+#
+# Shards are provisioned and torn down concurrently through queue_admin, with its retry of throttled
+# calls; teardown deletes exactly the shard queues, never other queues that share the prefix.
+# </summary>
+# -------------------------------------------------------------
+
+class ShardedQueue():
+
+    # Input Arguments:
+    # queue_service - QueueServiceClient the shards belong to
+    # queue_prefix - prefix of the shard queue names
+    # shard_count - number of shards
+    # concurrency - maximum number of shards created, deleted or queried at the same time
+    # refresh_interval - seconds between refreshes of the shard message counts, None to drain the shards uniformly
+    # seed - seed for the shard selection, for reproducible runs
+    def __init__(self, queue_service, queue_prefix, shard_count, concurrency=16, refresh_interval=5.0, seed=None):
+        self.queue_service = queue_service
+        self.queue_prefix = queue_prefix
+        self.shards = [queue_service.get_queue_client(queue_prefix + str(i)) for i in range(shard_count)]
+        self.concurrency = concurrency
+        self.refresh_interval = refresh_interval
+        self._next_shard = itertools.count()
+        self._random = random.Random(seed)
+        self._depths = [0] * shard_count
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    # Creates all shard queues concurrently.
+    def create(self, metadata=None):
+        self.shards = create_queues_with_prefix(self.queue_service, self.queue_prefix, len(self.shards),
+                                                self.concurrency, metadata)
+
+    # Deletes all shard queues concurrently and returns their names.
+    def delete(self):
+        return delete_queues_with_prefix(self.queue_service, self.queue_prefix, len(self.shards), self.concurrency)
+
+    # Returns the shard all messages with the given key are sent to.
+    # crc32 is used rather than hash() because hash() of a str changes between processes.
+    def shard_for_key(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        return zlib.crc32(key) % len(self.shards)
+
+    # Sends a message to the shard of key, or to the next shard round-robin when key is None.
+    # The returned message has a shard attribute with the index of the shard it was sent to.
+    def send_message(self, content, key=None, **kwargs):
+        index = next(self._next_shard) % len(self.shards) if key is None else self.shard_for_key(key)
+        message = self.shards[index].send_message(content, **kwargs)
+        message.shard = index
+        with self._lock:
+            self._depths[index] += 1
+        return message
+
+    # Reads the approximate message count of every shard concurrently.
+    def refresh_depths(self):
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(self.shards))) as executor:
+            depths = list(executor.map(lambda shard: shard.get_queue_properties().approximate_message_count, self.shards))
+        with self._lock:
+            self._depths = depths
+            self._refreshed_at = time.monotonic()
+        return depths
+
+    # Returns the estimated message count of every shard, refreshing the estimates when they are older than refresh_interval.
+    # Only one caller refreshes at a time, the others keep using the previous estimates meanwhile.
+    def depths(self):
+        refresh = False
+        with self._lock:
+            now = time.monotonic()
+            if self.refresh_interval is not None and (self._refreshed_at is None or now - self._refreshed_at >= self.refresh_interval):
+                self._refreshed_at = now
+                refresh = True
+            depths = list(self._depths)
+        return self.refresh_depths() if refresh else depths
+
+    # Returns the shard indexes in the order they should be received from: a weighted random
+    # order (Efraimidis-Spirakis) where the weight of a shard is its estimated message count plus one.
+    def _shard_order(self):
+        if self.refresh_interval is None:
+            order = list(range(len(self.shards)))
+            self._random.shuffle(order)
+            return order
+        depths = self.depths()
+        with self._lock:
+            keys = [self._random.random() ** (1.0 / (depth + 1)) for depth in depths]
+        return sorted(range(len(self.shards)), key=keys.__getitem__, reverse=True)
+
+    # Receives up to max_messages messages from one shard. Shards are tried in weighted random
+    # order until one returns messages, so an empty list means that every shard was empty.
+    # Each message has a shard attribute that delete_message and update_message use.
+    def receive_messages(self, max_messages=MAX_MESSAGES_PER_RECEIVE, visibility_timeout=None):
+        for index in self._shard_order():
+            messages = receive_batch(self.shards[index], max_messages, visibility_timeout)
+            with self._lock:
+                self._depths[index] = max(self._depths[index] - len(messages), 0) if messages else 0
+            if messages:
+                for message in messages:
+                    message.shard = index
+                return messages
+        return []
+
+    # Deletes a message returned by receive_messages from its shard.
+    def delete_message(self, message, **kwargs):
+        return self.shards[message.shard].delete_message(message, **kwargs)
+
+    # Updates a message returned by receive_messages in its shard.
+    def update_message(self, message, **kwargs):
+        updated = self.shards[message.shard].update_message(message, **kwargs)
+        updated.shard = message.shard
+        return updated
+
+# Compares draining unevenly filled shards uniformly and weighted by message count on the local
+# stand-in, counting the receive calls that found their shard empty. Only receives and property
+# reads are given a latency, so the time measured is the time spent polling.
+def run_benchmark(shard_count=8, message_count=4000, latency=0.002):
+    from local_queue_service import LocalQueueServiceClient
+
+    for refresh_interval in (None, 0.5):
+        queue_service = LocalQueueServiceClient(
+            operation_latency={'receive_messages': latency, 'get_queue_properties': latency})
+        sharded_queue = ShardedQueue(queue_service, 'benchmarkshard', shard_count, refresh_interval=refresh_interval, seed=1)
+        sharded_queue.create()
+        # shard i gets a share of the messages proportional to 2 ** i
+        total_weight = 2 ** shard_count - 1
+        for index, shard in enumerate(sharded_queue.shards):
+            for i in range(message_count * 2 ** index // total_weight):
+                shard.send_message('message' + str(i))
+        queue_service.call_counts.clear()
+
+        start = time.perf_counter()
+        received = batches = 0
+        while True:
+            messages = sharded_queue.receive_messages()
+            if not messages:
+                break
+            received += len(messages)
+            batches += 1
+            for message in messages:
+                sharded_queue.delete_message(message)
+        elapsed = time.perf_counter() - start
+        receive_calls = queue_service.call_counts['receive_messages']
+        print('{0:<9} drained {1} messages in {2:5.2f}s: {3} receive calls, {4} of them empty'.format(
+            'uniform' if refresh_interval is None else 'weighted', received, elapsed, receive_calls,
+            receive_calls - batches))
+        sharded_queue.delete()
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -26,22 +26,73 @@
 # 2. Set breakpoints and run the project. 
 #---------------------------------------------------------------------------
 
+import argparse
+import asyncio
 import config
+import queue_benchmark
 from queue_basic_samples import QueueBasicSamples
 from queue_advanced_samples import QueueAdvancedSamples
 
+parser = argparse.ArgumentParser(description='Azure Storage Queue samples for Python')
+parser.add_argument('mode', nargs='?', choices=['samples', 'bench'], default='samples',
+                    help='run the samples (default) or the throughput/latency benchmark')
+parser.add_argument('--async', dest='use_async', action='store_true',
+                    help='run on the asyncio engine (azure.storage.queue.aio)')
+parser.add_argument('--local', action='store_true',
+                    help='run against the in-process queue service stand-in instead of a storage account')
+parser.add_argument('--pool-size', type=int, default=32,
+                    help='HTTP connections kept open to the storage account (default 32)')
+queue_benchmark.add_arguments(parser)
+args = parser.parse_args()
+
 print('Azure Storage Queue samples for Python')
 
 storage_connection_string = config.STORAGE_CONNECTION_STRING
 
-#Basic Queue samples
-print ('---------------------------------------------------------------')
-print('Azure Storage Queue samples')
-queue_basic_samples = QueueBasicSamples()
-queue_basic_samples.run_all_samples(storage_connection_string)
-
-#Advanced Queue samples
-print ('---------------------------------------------------------------')
-print('Azure Storage Advanced Queue samples')
-queue_advanced_samples = QueueAdvancedSamples()
-queue_advanced_samples.run_all_samples(storage_connection_string)
\ No newline at end of file
+if args.mode == 'bench':
+    print('Azure Storage Queue benchmark')
+    queue_benchmark.run_from_arguments(args, storage_connection_string)
+elif args.use_async:
+    from queue_basic_samples_async import AsyncQueueBasicSamples
+    from queue_advanced_samples_async import AsyncQueueAdvancedSamples
+
+    local_queue_service = None
+    if args.local:
+        from local_queue_service import AsyncLocalQueueServiceClient
+        local_queue_service = AsyncLocalQueueServiceClient()
+
+    async def run_async_samples():
+        #Basic Queue samples
+        print ('---------------------------------------------------------------')
+        print('Azure Storage Queue samples (async)')
+        await AsyncQueueBasicSamples().run_all_samples(storage_connection_string, local_queue_service)
+
+        #Advanced Queue samples
+        print ('---------------------------------------------------------------')
+        print('Azure Storage Advanced Queue samples (async)')
+        await AsyncQueueAdvancedSamples().run_all_samples(storage_connection_string, local_queue_service)
+
+    asyncio.run(run_async_samples())
+else:
+    from queue_client_factory import QueueClientFactory
+
+    # both sample classes share one client and connection pool instead of each parsing the
+    # connection string and opening its own connections; the pool is closed even when a sample raises
+    with QueueClientFactory(pool_size=args.pool_size) as client_factory:
+        if args.local:
+            from local_queue_service import LocalQueueServiceClient
+            queue_service = LocalQueueServiceClient()
+        else:
+            queue_service = client_factory.get_service_client(storage_connection_string)
+
+        #Basic Queue samples
+        print ('---------------------------------------------------------------')
+        print('Azure Storage Queue samples')
+        queue_basic_samples = QueueBasicSamples()
+        queue_basic_samples.run_all_samples(storage_connection_string, queue_service)
+
+        #Advanced Queue samples
+        print ('---------------------------------------------------------------')
+        print('Azure Storage Advanced Queue samples')
+        queue_advanced_samples = QueueAdvancedSamples()
+        queue_advanced_samples.run_all_samples(storage_connection_string, queue_service)